@@ -0,0 +1,50 @@
+# Generated by Django 3.1.13 on 2026-10-18 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learnapp', '0030_comment_score_index'),
+        ('accounts', '0008_auto_20211104_0103'),
+    ]
+
+    operations = [
+        # The auto-created through table becomes SavedPost, only the saved column is new. Saves made before this
+        # migration get its time, ties are broken by id.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql="""
+                        ALTER TABLE accounts_userprofile_saved_posts
+                        ADD COLUMN saved timestamp with time zone NOT NULL DEFAULT now();
+                        ALTER TABLE accounts_userprofile_saved_posts ALTER COLUMN saved DROP DEFAULT;
+                    """,
+                    reverse_sql='ALTER TABLE accounts_userprofile_saved_posts DROP COLUMN saved',
+                ),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='SavedPost',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('saved', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='learnapp.post')),
+                        ('userprofile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.userprofile')),
+                    ],
+                    options={
+                        'db_table': 'accounts_userprofile_saved_posts',
+                        'unique_together': {('userprofile', 'post')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='userprofile',
+                    name='saved_posts',
+                    field=models.ManyToManyField(blank=True, through='accounts.SavedPost', to='learnapp.Post'),
+                ),
+            ],
+        ),
+    ]
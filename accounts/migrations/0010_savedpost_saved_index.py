@@ -0,0 +1,20 @@
+# Generated by Django 3.1.13 on 2026-10-18 10:05
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking saves
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0009_savedpost'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='savedpost',
+            index=models.Index(fields=['userprofile', '-saved', '-id'], name='savedpost_profile_saved_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.1.13 on 2026-10-18 10:30
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking signups
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0010_savedpost_saved_index'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        # Both on UPPER(username) since that's what Django compares for istartswith/icontains. Expression indexes
+        # can't be declared in Meta.indexes before Django 3.2, so these live only here.
+        # Prefix searches as a range scan, including prefixes too short for trigrams
+        migrations.RunSQL(
+            sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS accounts_user_username_prefix_idx '
+                'ON accounts_user (UPPER(username) text_pattern_ops)',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS accounts_user_username_prefix_idx',
+        ),
+        # Substring searches
+        migrations.RunSQL(
+            sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS accounts_user_username_trgm_idx '
+                'ON accounts_user USING gin (UPPER(username) gin_trgm_ops)',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS accounts_user_username_trgm_idx',
+        ),
+    ]
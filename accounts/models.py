@@ -2,6 +2,7 @@
 
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from learnapp.validators import username_validator
 
@@ -60,7 +61,27 @@ class User(AbstractUser):
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
     category = models.ManyToManyField('learnapp.Category', blank=True)
-    saved_posts = models.ManyToManyField('learnapp.Post', blank=True)
+    saved_posts = models.ManyToManyField('learnapp.Post', blank=True, through='SavedPost')
 
     def __str__(self):
         return f"{self.user}'s Profile"
+
+
+class SavedPost(models.Model):
+    """Through model of UserProfile.saved_posts, remembers when each post was saved."""
+
+    userprofile = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    post = models.ForeignKey('learnapp.Post', on_delete=models.CASCADE)
+    saved = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # The table of the former auto-created through model
+        db_table = 'accounts_userprofile_saved_posts'
+        unique_together = [('userprofile', 'post')]
+        indexes = [
+            # Backs the keyset-paginated saved posts list
+            models.Index(fields=['userprofile', '-saved', '-id'], name='savedpost_profile_saved_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.userprofile} saved {self.post_id}"
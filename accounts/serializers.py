@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.contrib.auth.password_validation import validate_password as default_password_validator
 from .models import UserProfile
+from learnapp.models import Collection, Post
 from learnapp.serializers import CategorySerializer, PostSerializer
 from learnapp.validators import username_validator
 
@@ -53,6 +55,9 @@ class UserSerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     # category = CategorySerializer(many=True)
     # saved_posts = PostSerializer(many=True)
+    # Declared since a through model makes the default field read only, rendered as ids in to_representation
+    saved_posts = serializers.PrimaryKeyRelatedField(many=True, queryset=Post.objects.all(), write_only=True,
+                                                     required=False)
 
     def validate(self, attrs):
         save_type = self.context['request'].data.get('type', None) in ['post_add', 'post_remove']
@@ -66,7 +71,11 @@ class UserProfileSerializer(serializers.ModelSerializer):
         response = super().to_representation(instance)
         response['user'] = UserSerializer(instance.user).data
         response['category'] = CategorySerializer(instance.category, many=True).data
-        response['saved_posts'] = PostSerializer(instance.saved_posts, many=True).data
+        # Ids only, latest saved first, the posts themselves are paginated by SavedPostListView
+        response['saved_posts'] = list(
+            instance.savedpost_set.order_by('-saved', '-id').values_list('post_id', flat=True)
+        )
+        response['saved_post_count'] = len(response['saved_posts'])
         return response
 
     def update(self, instance, validated_data):
@@ -75,10 +84,10 @@ class UserProfileSerializer(serializers.ModelSerializer):
         saved_posts = validated_data.get('saved_posts')
 
         if save_type == 'post_remove' and saved_posts:
-            instance.saved_posts.remove(*validated_data.get('saved_posts'))
-            # Remove removed post from all collections as well
-            for collection in instance.user.collection_set.all():
-                collection.posts.remove(*validated_data.get('saved_posts'))
+            with transaction.atomic():
+                instance.saved_posts.remove(*validated_data.get('saved_posts'))
+                # Remove removed post from all collections as well
+                Collection.objects.filter(author=instance.user).remove_posts([post.id for post in saved_posts])
         elif save_type == 'post_add' and saved_posts:
             instance.saved_posts.add(*validated_data.get('saved_posts'))
 
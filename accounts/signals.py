@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from . import user_cache
+from .models import UserProfile
+
+UserModel = get_user_model()
+
+
+# USER CACHE
+def invalidate_user(user_id):
+    # Now, so the rest of this transaction sees the change, and after commit, or another worker could cache the old
+    # rows again under the first new stamp
+    user_cache.invalidate(user_id)
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
+
+
+@receiver(post_save, sender=UserModel)
+@receiver(post_delete, sender=UserModel)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=UserProfile.category.through)
+def invalidate_cached_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_user(instance.user_id)
+        return
+    if action in ('post_add', 'post_remove'):
+        # Profiles are keyed by their user
+        user_ids = pk_set
+    elif action == 'pre_clear':
+        user_ids = instance.userprofile_set.values_list('pk', flat=True)
+    else:
+        return
+    for user_id in user_ids:
+        invalidate_user(user_id)
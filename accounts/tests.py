@@ -1,3 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+from learnapp.models import Category
+from . import user_cache
+from .authentication import CachedJWTAuthentication
+from .models import UserProfile
 
-# Create your tests here.
+UserModel = get_user_model()
+
+
+class UserCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user_cache._entries.clear()
+        self.categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        self.user = UserModel.objects.create_user(email='reader@test.local', password=None, username='reader')
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.profile.category.add(self.categories[0])
+
+    def assertCached(self):
+        with self.assertNumQueries(0):
+            return user_cache.get_user(self.user.id)
+
+    def assertReloaded(self):
+        with self.assertNumQueries(2):
+            return user_cache.get_user(self.user.id)
+
+    def test_served_from_memory(self):
+        self.assertEqual(user_cache.get_user(self.user.id).cached_category_ids, [self.categories[0].id])
+        user = self.assertCached()
+        # Callers get a copy
+        user.username = 'changed'
+        self.assertEqual(self.assertCached().username, 'reader')
+
+    def test_saving_the_user_invalidates(self):
+        user_cache.get_user(self.user.id)
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.assertReloaded().is_active)
+        self.assertCached()
+
+    def test_saving_the_profile_invalidates(self):
+        user_cache.get_user(self.user.id)
+        self.profile.save()
+        self.assertReloaded()
+
+    def test_followed_categories_invalidate(self):
+        user_cache.get_user(self.user.id)
+        self.profile.category.add(self.categories[1])
+        self.assertEqual(sorted(self.assertReloaded().cached_category_ids),
+                         [self.categories[0].id, self.categories[1].id])
+        self.profile.category.remove(self.categories[0])
+        self.assertEqual(self.assertReloaded().cached_category_ids, [self.categories[1].id])
+        self.profile.category.clear()
+        self.assertEqual(self.assertReloaded().cached_category_ids, [])
+
+    def test_followers_changed_from_the_category_side_invalidate(self):
+        user_cache.get_user(self.user.id)
+        self.categories[2].userprofile_set.add(self.profile)
+        self.assertIn(self.categories[2].id, self.assertReloaded().cached_category_ids)
+        self.categories[2].userprofile_set.clear()
+        self.assertNotIn(self.categories[2].id, self.assertReloaded().cached_category_ids)
+
+    def test_deleted_user(self):
+        user_cache.get_user(self.user.id)
+        user_id = self.user.id
+        self.user.delete()
+        self.assertIsNone(user_cache.get_user(user_id))
+
+
+class CachedJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user_cache._entries.clear()
+        self.user = UserModel.objects.create_user(email='reader@test.local', password=None, username='reader')
+        UserProfile.objects.create(user=self.user)
+        self.token = CachedJWTAuthentication().get_validated_token(str(AccessToken.for_user(self.user)))
+
+    def test_user_from_cache(self):
+        self.assertEqual(CachedJWTAuthentication().get_user(self.token).id, self.user.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedJWTAuthentication().get_user(self.token).id, self.user.id)
+
+    def test_deactivated_user_is_rejected(self):
+        CachedJWTAuthentication().get_user(self.token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            CachedJWTAuthentication().get_user(self.token)
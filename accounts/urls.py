@@ -11,4 +11,5 @@ urlpatterns = [
     # path('delete/', UserDestroyView.as_view(), name='user_delete'),
     path('', UserRetrieveUpdateDestroyView.as_view(), name='user_delete'),
     path('profile/', UserProfileUpdateView.as_view(), name='user_profile_update'),
+    path('profile/saved/', SavedPostListView.as_view(), name='user_saved_posts'),
 ]
@@ -0,0 +1,69 @@
+"""Per-worker cache of authenticated users and the ids of the categories they follow.
+
+Entries are keyed by user id and hold the version stamp of that user from the shared Django cache, which saving the
+user or their profile bumps (see signals.py). An entry is only used while its stamp is current and for at most
+USER_CACHE_TTL seconds, and the least recently used entries are dropped beyond USER_CACHE_SIZE. Callers get a copy,
+so nothing they cache on the instance leaks into other requests.
+"""
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from .models import UserProfile
+
+UserModel = get_user_model()
+
+VERSION_KEY = 'user:version:{}'
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+
+def version(user_id):
+    key = VERSION_KEY.format(user_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        # First use, or evicted: a fresh stamp can't match an entry cached under the old one
+        cache.add(key, uuid.uuid4().hex, settings.USER_CACHE_VERSION_TIMEOUT)
+        stamp = cache.get(key)
+    return stamp
+
+
+def get_user(user_id):
+    """The user with user_id, with cached_category_ids set, or None if there is no such user."""
+    stamp = version(user_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None and entry[0] == stamp and entry[1] > now:
+            _entries.move_to_end(user_id)
+            return copy.copy(entry[2])
+
+    user = UserModel.objects.filter(id=user_id).first()
+    if user is None:
+        return None
+    user.cached_category_ids = list(
+        UserProfile.category.through.objects.filter(userprofile_id=user_id).values_list('category_id', flat=True)
+    )
+    with _lock:
+        _entries[user_id] = (stamp, now + settings.USER_CACHE_TTL, user)
+        _entries.move_to_end(user_id)
+        while len(_entries) > settings.USER_CACHE_SIZE:
+            _entries.popitem(last=False)
+    return copy.copy(user)
+
+
+def category_ids(user):
+    """Ids of the categories user follows, from the cache when the user came through it."""
+    cached = getattr(user, 'cached_category_ids', None)
+    if cached is not None:
+        return list(cached)
+    return list(user.userprofile.category.values_list('id', flat=True))
+
+
+def invalidate(user_id):
+    cache.set(VERSION_KEY.format(user_id), uuid.uuid4().hex, settings.USER_CACHE_VERSION_TIMEOUT)
@@ -3,11 +3,14 @@ from rest_framework import permissions
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import PermissionDenied
-from rest_framework.generics import CreateAPIView, ListCreateAPIView, DestroyAPIView, RetrieveUpdateAPIView, \
-    RetrieveUpdateDestroyAPIView
+from rest_framework.fields import DateTimeField
+from rest_framework.generics import CreateAPIView, ListAPIView, ListCreateAPIView, DestroyAPIView, \
+    RetrieveUpdateAPIView, RetrieveUpdateDestroyAPIView
 from django.contrib.auth import get_user_model
 from .serializers import UserSerializer, UserProfileSerializer
-from .models import UserProfile
+from .models import SavedPost, UserProfile
+from learnapp.pagination import KeysetPagination
+from learnapp.serializers import PostSerializer
 
 UserModel = get_user_model()
 
@@ -23,10 +26,25 @@ class UserCreateView(CreateAPIView):
 
 
 class UserListView(ListCreateAPIView):
+    """User directory ordered by username. ?q= searches usernames by prefix, or anywhere with &match=contains.
+
+    Both searches are case insensitive, backed by the prefix and trigram indexes on UPPER(username).
+    """
     model = UserModel
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserSerializer
-    queryset = UserModel.objects.all()
+    pagination_class = KeysetPagination
+    ordering = ('username',)
+
+    def get_queryset(self):
+        queryset = UserModel.objects.all()
+        query = self.request.query_params.get('q')
+        if query:
+            if self.request.query_params.get('match') == 'contains':
+                queryset = queryset.filter(username__icontains=query)
+            else:
+                queryset = queryset.filter(username__istartswith=query)
+        return queryset.order_by(*self.ordering)
 
 
 class UserRetrieveUpdateDestroyView(RetrieveUpdateDestroyAPIView):
@@ -81,7 +99,7 @@ class UserProfileUpdateView(RetrieveUpdateAPIView):
     model = UserProfile
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserProfileSerializer
-    queryset = UserProfile.objects.all()
+    queryset = UserProfile.objects.select_related('user').prefetch_related('category')
 
     def get_object(self):
         queryset = self.get_queryset()
@@ -99,3 +117,25 @@ class UserProfileUpdateView(RetrieveUpdateAPIView):
             serializer.save()
         else:
             raise PermissionDenied(detail='Permission denied.')
+
+
+class SavedPostListView(ListAPIView):
+    """The user's saved posts, latest saved first, each with its 'saved' time."""
+    model = SavedPost
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = PostSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-saved', '-id')
+
+    def get_queryset(self):
+        # The Post manager's defer doesn't apply through select_related
+        return SavedPost.objects.filter(userprofile=self.request.user.id).select_related(
+            'post__author').defer('post__search_vector')
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        posts = self.get_serializer([saved.post for saved in page], many=True).data
+        saved_field = DateTimeField()
+        for saved, post in zip(page, posts):
+            post['saved'] = saved_field.to_representation(saved.saved)
+        return self.get_paginated_response(posts)
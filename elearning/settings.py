@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 import os
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 from datetime import timedelta
 from pathlib import Path
@@ -103,9 +104,55 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Every web, worker and release process must see the same version stamps and vote counters, so with DJANGO_DEBUG=False
+# a shared cache is required and settings refuse to load without one. Either set REDIS_URL (the Heroku Redis add-on
+# does), which selects django-redis, or set CACHE_BACKEND and CACHE_LOCATION, e.g.
+#   CACHE_BACKEND=django_redis.cache.RedisCache CACHE_LOCATION=redis://host:6379/0
+#   CACHE_BACKEND=django.core.cache.backends.memcached.PyLibMCCache CACHE_LOCATION=host:11211 (pip install pylibmc)
+# Per-process memory (LocMemCache) is the default with DEBUG on.
+REDIS_URL = config('REDIS_URL', default=None)
+CACHE_BACKEND = config('CACHE_BACKEND', default=(
+    'django_redis.cache.RedisCache' if REDIS_URL else
+    'django.core.cache.backends.locmem.LocMemCache' if DEBUG else None
+))
+if not CACHE_BACKEND or (not DEBUG and CACHE_BACKEND.endswith('LocMemCache')):
+    raise ImproperlyConfigured('Set REDIS_URL, or CACHE_BACKEND to a cache shared by all workers, when DJANGO_DEBUG is '
+                               'False')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default=REDIS_URL or 'eagerapp'),
+    }
+}
+
+# Seconds a cached feed page lives, invalidation is by version stamp so this only bounds memory
+FEED_CACHE_TIMEOUT = 300
+
+# Categories are cached per worker under a shared version stamp, re-read at most this often (seconds)
+CATEGORY_CACHE_CHECK_INTERVAL = 1
+# Seconds a worker trusts its in-process table without re-reading the database, even if the stamp hasn't moved
+CATEGORY_CACHE_LOCAL_TTL = 60
+CATEGORY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Write-behind vote tallies (learnapp/vote_buffer.py), needs a cache shared by the workers and the flush_votes command
+# With it on, the Procfile's votes process (flush_votes every 5 seconds) must run: heroku ps:scale votes=1
+VOTE_BUFFER_ENABLED = config('VOTE_BUFFER_ENABLED', default=False, cast=bool)
+VOTE_BUFFER_CACHE = 'default'
+# Seconds before a lost journal entry is recreated by the target's next vote, keep it well above the flush interval
+VOTE_BUFFER_DIRTY_TIMEOUT = 600
+
+# Authenticated users are cached per worker (accounts/user_cache.py) for up to USER_CACHE_TTL seconds, and dropped as
+# soon as they or their profile are saved
+USER_CACHE_TTL = 60
+USER_CACHE_SIZE = 10000
+USER_CACHE_VERSION_TIMEOUT = 60 * 60 * 24
+
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
@@ -160,8 +207,25 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-# Temporary file, generate temp path for files smaller than 0 bytes (sending to firebase)
-FILE_UPLOAD_MAX_MEMORY_SIZE = 0
+# File storage backend (learnapp/storage_backends.py), created by the first request that needs it. The HTTP pool should
+# cover every thread of a worker. LocalBackend keeps files under STORAGE_LOCAL_ROOT, for running without Firebase.
+STORAGE_BACKEND = config('STORAGE_BACKEND', default='learnapp.storage_backends.FirebaseBackend')
+STORAGE_HTTP_POOL_SIZE = config('STORAGE_HTTP_POOL_SIZE', cast=int, default=16)
+STORAGE_LOCAL_ROOT = config('STORAGE_LOCAL_ROOT', default=os.path.join(BASE_DIR, 'storage'))
+STORAGE_LOCAL_URL = config('STORAGE_LOCAL_URL', default='http://localhost:8000/storage/')
+
+# The static background manifest (learnapp/backgrounds.py) is relisted in the background once older than the TTL, and
+# clients may reuse it for BACKGROUND_MANIFEST_MAX_AGE seconds (then revalidate it by ETag)
+BACKGROUND_MANIFEST_TTL = 60 * 60
+BACKGROUND_MANIFEST_MAX_AGE = 60 * 60 * 24
+
+# Resized WebP copies of uploaded images (learnapp/image_variants.py), each fits in a width x width box. Rendered by
+# IMAGE_PIPELINE_WORKERS processes per worker, empty IMAGE_VARIANTS turns the pipeline off.
+IMAGE_VARIANTS = {
+    'thumb': {'width': 320, 'quality': 70},
+    'medium': {'width': 1080, 'quality': 80},
+}
+IMAGE_PIPELINE_WORKERS = config('IMAGE_PIPELINE_WORKERS', cast=int, default=2)
 
 # # Extra places for collectstatic to find static files.
 # STATICFILES_DIRS = (
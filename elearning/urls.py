@@ -13,6 +13,9 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from urllib.parse import urlparse
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
@@ -23,3 +26,5 @@ urlpatterns = [
     path('api/learnapp/', include('learnapp.urls')),
 ]
 urlpatterns += staticfiles_urlpatterns()
+# Files of the local storage backend (only served with DEBUG on)
+urlpatterns += static(urlparse(settings.STORAGE_LOCAL_URL).path, document_root=settings.STORAGE_LOCAL_ROOT)
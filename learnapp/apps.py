@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class LearnappConfig(AppConfig):
     name = 'learnapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,52 @@
+"""Cached manifest of the static background images.
+
+Building it lists every object in the bucket and asks for each match's URL, far too slow for a request. The manifest
+is kept in the shared cache without expiry and only requests read it: once it is older than BACKGROUND_MANIFEST_TTL
+the first request to notice starts a refresh in a background thread and still gets the old one. The
+refresh_backgrounds command rebuilds it right away, run it on deploy or after changing the backgrounds.
+"""
+import hashlib
+import json
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+MANIFEST_KEY = 'backgrounds:manifest'
+REFRESH_LOCK_KEY = 'backgrounds:refresh:lock'
+# Longest a refresh may hold the lock, a crashed one doesn't block the next for longer
+REFRESH_TIMEOUT = 300
+
+
+def manifest():
+    """{'urls', 'etag', 'refreshed'} of the current manifest, or None while the first one is being built."""
+    current = cache.get(MANIFEST_KEY)
+    if current is None or time.time() - current['refreshed'] >= settings.BACKGROUND_MANIFEST_TTL:
+        refresh_in_background()
+    return current
+
+
+def refresh():
+    """List the backgrounds in storage and store them as the current manifest."""
+    from .storage import FileStorageView
+    urls = FileStorageView().static_files_getter()
+    current = {
+        'urls': urls,
+        'etag': hashlib.sha1(json.dumps(urls).encode()).hexdigest(),
+        'refreshed': time.time(),
+    }
+    cache.set(MANIFEST_KEY, current, None)
+    return current
+
+
+def refresh_in_background():
+    if not cache.add(REFRESH_LOCK_KEY, 1, REFRESH_TIMEOUT):
+        return
+
+    def run():
+        try:
+            refresh()
+        finally:
+            cache.delete(REFRESH_LOCK_KEY)
+
+    threading.Thread(target=run, daemon=True).start()
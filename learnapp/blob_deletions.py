@@ -0,0 +1,45 @@
+"""Queue of stored objects to delete.
+
+Dropping the last FileRef of an object queues the object here in the same transaction, so requests never wait on
+storage and a deletion can't get lost between the two. The delete_blobs command drains the queue in batches. Rows
+are claimed with SKIP LOCKED, so several drainers can run at once, and failed deletions are retried with backoff.
+
+Nothing else deletes stored objects: the Procfile's blobs process runs delete_blobs every 30 seconds and must be
+scaled to at least one dyno (heroku ps:scale blobs=1), or a cron job has to run the command instead.
+"""
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import BlobDeletion
+from .storage_backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+# Seconds, the longest a failing deletion waits for its next attempt
+MAX_BACKOFF = 60 * 60
+
+
+def enqueue(names):
+    BlobDeletion.objects.bulk_create([BlobDeletion(name=name) for name in names])
+
+
+def drain(batch_size=100):
+    """Delete up to batch_size due objects. Returns how many were deleted and how many failed."""
+    backend = get_backend()
+    with transaction.atomic():
+        batch = list(BlobDeletion.objects.select_for_update(skip_locked=True).filter(
+            next_attempt__lte=timezone.now()).order_by('next_attempt', 'id')[:batch_size])
+        deleted, failed = [], []
+        for deletion in batch:
+            try:
+                backend.delete(deletion.name)
+                deleted.append(deletion.id)
+            except Exception:
+                logger.exception('Deleting %s failed (attempt %d)', deletion.name, deletion.attempts + 1)
+                deletion.attempts += 1
+                deletion.next_attempt = timezone.now() + timedelta(seconds=min(2 ** deletion.attempts, MAX_BACKOFF))
+                failed.append(deletion)
+        BlobDeletion.objects.filter(id__in=deleted).delete()
+        BlobDeletion.objects.bulk_update(failed, ['attempts', 'next_attempt'])
+    return len(deleted), len(failed)
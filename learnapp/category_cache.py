@@ -0,0 +1,72 @@
+"""Two-level cache of the Category table.
+
+The table is tiny and almost never changes. The shared Django cache holds it under a version stamp, and every worker
+keeps the table for the current stamp in memory. Saving or deleting a category bumps the stamp, other workers notice
+it on their next stamp check (at most CATEGORY_CACHE_CHECK_INTERVAL seconds later) and refetch the table once.
+
+The in-process copy is also dropped after CATEGORY_CACHE_LOCAL_TTL seconds and re-read from the database, so a worker
+whose stamp never moves (a cache backend that isn't actually shared) is stale for a bounded time, not until restart.
+"""
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from .models import Category
+
+VERSION_KEY = 'category:version'
+TABLE_KEY = 'category:table:{}'
+
+_checked = {'version': None, 'at': 0.0}
+_local = {'version': None, 'at': 0.0, 'table': None, 'names': None}
+
+
+def version():
+    now = time.monotonic()
+    if _checked['version'] is None or now - _checked['at'] >= settings.CATEGORY_CACHE_CHECK_INTERVAL:
+        stamp = cache.get(VERSION_KEY)
+        if stamp is None:
+            # First use, or evicted: a fresh stamp can't collide with a table cached under the old one
+            cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+            stamp = cache.get(VERSION_KEY)
+        _checked.update(version=stamp, at=now)
+    return _checked['version']
+
+
+def _load():
+    stamp = version()
+    now = time.monotonic()
+    if _local['version'] == stamp and now - _local['at'] < settings.CATEGORY_CACHE_LOCAL_TTL:
+        return _local
+    key = TABLE_KEY.format(stamp)
+    # Same stamp but expired: the shared copy may be just as old as ours, go to the database
+    table = cache.get(key) if _local['version'] != stamp else None
+    if table is None:
+        table = list(Category.objects.values('id', 'name'))
+        cache.set(key, table, settings.CATEGORY_CACHE_TIMEOUT)
+    _local.update(
+        version=stamp, at=now, table=table, names={category['id']: category['name'] for category in table},
+    )
+    return _local
+
+
+def categories():
+    """Every category as {'id', 'name'} dicts in name order, the same shape CategorySerializer produces."""
+    return _load()['table']
+
+
+def name(category_id):
+    names = _load()['names']
+    if category_id in names:
+        return names[category_id]
+    # Created moments ago by another worker, don't wait for the next check or the TTL
+    found = Category.objects.filter(id=category_id).values_list('name', flat=True).first()
+    if found is not None:
+        # The shared table is missing it too, expire ours so the next call reloads both from the database
+        _local['at'] = float('-inf')
+    return found
+
+
+def invalidate():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    # The worker that made the change must not serve its stale table until the next check
+    _checked['version'] = None
@@ -0,0 +1,161 @@
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.db.models.functions import Now
+from . import vote_buffer
+from .models import Comment, Post, Vote, VoteComment
+
+
+def vote_deltas(old_vote, new_vote):
+    """Return the (score, upvotes, downvotes) change of moving a vote from old_vote to new_vote.
+
+    A missing vote is passed as None (or 0), so creating a vote is (None, vote) and deleting it is (vote, None).
+    """
+    old_vote, new_vote = old_vote or 0, new_vote or 0
+    return (
+        new_vote - old_vote,
+        int(new_vote == 1) - int(old_vote == 1),
+        int(new_vote == -1) - int(old_vote == -1),
+    )
+
+
+def apply_post_vote(post_id, old_vote, new_vote):
+    """Atomically shift the stored tallies of a post, call it in the same transaction as the Vote write."""
+    score, upvotes, downvotes = vote_deltas(old_vote, new_vote)
+    if not (score or upvotes or downvotes):
+        return
+    if vote_buffer.enabled():
+        vote_buffer.add_on_commit('post', post_id, {'score': score, 'upvotes': upvotes, 'downvotes': downvotes})
+        return
+    Post.objects.filter(id=post_id).update(
+        score=F('score') + score,
+        upvotes=F('upvotes') + upvotes,
+        downvotes=F('downvotes') + downvotes,
+        updated=Now(),
+    )
+
+
+def apply_comment_vote(comment_id, old_vote, new_vote):
+    """Atomically shift the stored score of a comment, call it in the same transaction as the VoteComment write."""
+    score = vote_deltas(old_vote, new_vote)[0]
+    if score and vote_buffer.enabled():
+        vote_buffer.add_on_commit('comment', comment_id, {'score': score})
+    elif score:
+        Comment.objects.filter(id=comment_id).update(score=F('score') + score)
+
+
+# Moves the (voter, target) vote to %(vote)s and shifts the target's tallies by the difference in the same statement.
+# The old vote is read with FOR UPDATE, which under READ COMMITTED sees the latest committed version of the row. A vote
+# row inserted concurrently by the same voter isn't visible at all, its INSERT then does nothing and the statement
+# returns no row, the caller runs it again.
+SET_VOTE_SQL = """
+    WITH old AS (
+        SELECT id, vote FROM {votes} WHERE voter_id = %(voter)s AND {target_id} = %(target)s FOR UPDATE
+    ), changed AS (
+        UPDATE {votes} SET vote = %(vote)s FROM old WHERE {votes}.id = old.id
+        RETURNING old.vote AS old_vote, {votes}.vote AS new_vote
+    ), added AS (
+        INSERT INTO {votes} (voter_id, {target_id}, vote)
+        SELECT %(voter)s, %(target)s, %(vote)s
+        WHERE NOT EXISTS (SELECT 1 FROM old) AND EXISTS (SELECT 1 FROM {targets} WHERE id = %(target)s)
+        ON CONFLICT (voter_id, {target_id}) DO NOTHING
+        RETURNING NULL::integer AS old_vote, vote AS new_vote
+    ), change AS (
+        SELECT * FROM changed UNION ALL SELECT * FROM added
+    ){tally}
+"""
+
+CLEAR_VOTE_SQL = """
+    WITH change AS (
+        DELETE FROM {votes} WHERE voter_id = %(voter)s AND {target_id} = %(target)s
+        RETURNING vote AS old_vote, NULL::integer AS new_vote
+    ){tally}
+"""
+
+POST_DELTA_SQL = """, delta AS (
+        SELECT COALESCE(new_vote, 0) - COALESCE(old_vote, 0) AS score,
+               (new_vote IS NOT DISTINCT FROM 1)::integer - (old_vote IS NOT DISTINCT FROM 1)::integer AS upvotes,
+               (new_vote IS NOT DISTINCT FROM -1)::integer - (old_vote IS NOT DISTINCT FROM -1)::integer AS downvotes
+        FROM change
+    )"""
+
+COMMENT_DELTA_SQL = """, delta AS (
+        SELECT COALESCE(new_vote, 0) - COALESCE(old_vote, 0) AS score FROM change
+    )"""
+
+POST_TALLY_SQL = POST_DELTA_SQL + """
+    UPDATE {targets} SET
+        score = {targets}.score + delta.score,
+        upvotes = {targets}.upvotes + delta.upvotes,
+        downvotes = {targets}.downvotes + delta.downvotes,
+        updated = CASE WHEN delta.score <> 0 THEN now() ELSE {targets}.updated END
+    FROM delta WHERE {targets}.id = %(target)s
+    RETURNING {targets}.score, {targets}.category_id
+"""
+
+COMMENT_TALLY_SQL = COMMENT_DELTA_SQL + """
+    UPDATE {targets} SET score = {targets}.score + delta.score
+    FROM delta WHERE {targets}.id = %(target)s
+    RETURNING {targets}.score
+"""
+
+# With the vote buffer the target row is only read, the deltas come back to be buffered
+POST_BUFFERED_SQL = POST_DELTA_SQL + """
+    SELECT {targets}.score, {targets}.category_id, delta.score, delta.upvotes, delta.downvotes
+    FROM delta, {targets} WHERE {targets}.id = %(target)s
+"""
+
+COMMENT_BUFFERED_SQL = COMMENT_DELTA_SQL + """
+    SELECT {targets}.score, delta.score FROM delta, {targets} WHERE {targets}.id = %(target)s
+"""
+
+
+def put_post_vote(voter_id, post_id, vote):
+    """Set (or with vote 0 clear) a post vote in one statement, returning (score, category_id) or None if no post."""
+    if not vote_buffer.enabled():
+        return _put_vote(Vote, 'post', POST_TALLY_SQL, voter_id, post_id, vote, ('score', 'category_id'))
+    row = _put_vote(Vote, 'post', POST_BUFFERED_SQL, voter_id, post_id, vote, ('score', 'category_id'))
+    if row is None:
+        return None
+    score, category_id, *deltas = row
+    return score + _buffer('post', post_id, ('score', 'upvotes', 'downvotes'), deltas), category_id
+
+
+def put_comment_vote(voter_id, comment_id, vote):
+    """Set (or with vote 0 clear) a comment vote in one statement, returning (score,) or None if no comment."""
+    if not vote_buffer.enabled():
+        return _put_vote(VoteComment, 'comment', COMMENT_TALLY_SQL, voter_id, comment_id, vote, ('score',))
+    row = _put_vote(VoteComment, 'comment', COMMENT_BUFFERED_SQL, voter_id, comment_id, vote, ('score',))
+    if row is None:
+        return None
+    score, *deltas = row
+    return score + _buffer('comment', comment_id, ('score',), deltas),
+
+
+def _buffer(kind, target_id, fields, deltas):
+    """Buffer the deltas a put statement returned (none when nothing changed), returning the pending score."""
+    # The statement ran in autocommit, it's already committed
+    if any(deltas):
+        vote_buffer.add(kind, target_id, dict(zip(fields, deltas)))
+    return vote_buffer.pending(kind, [target_id]).get(target_id, {}).get('score', 0)
+
+
+def _put_vote(vote_model, target_name, tally_sql, voter_id, target_id, vote, returned):
+    target_model = vote_model._meta.get_field(target_name).related_model
+    names = {
+        'votes': connection.ops.quote_name(vote_model._meta.db_table),
+        'targets': connection.ops.quote_name(target_model._meta.db_table),
+        'target_id': connection.ops.quote_name(vote_model._meta.get_field(target_name).column),
+    }
+    sql = (SET_VOTE_SQL if vote else CLEAR_VOTE_SQL).format(tally=tally_sql.format(**names), **names)
+    params = {'voter': voter_id, 'target': target_id, 'vote': vote}
+    for attempt in range(5):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is not None:
+            return row
+        # No row changed: clearing a missing vote, a missing target, or lost to a concurrent first vote
+        row = target_model.objects.filter(id=target_id).values_list(*returned).first()
+        if row is None or not vote:
+            return row
+    raise OperationalError(f"Vote on {target_model.__name__} {target_id} kept conflicting")
@@ -0,0 +1,69 @@
+"""Shared cache of PostListView pages.
+
+Pages are keyed by the followed category set, the query string (ordering, filters, cursor, page size) and a version
+stamp per category, so users following the same categories share entries. Any post or vote change bumps the stamp of
+the affected categories, which orphans every page built from them; the orphans simply expire.
+"""
+import hashlib
+import json
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'feed:category:{}'
+HITS_KEY = 'feed:stats:hits'
+MISSES_KEY = 'feed:stats:misses'
+
+
+def category_versions(category_ids):
+    keys = [VERSION_KEY.format(category_id) for category_id in category_ids]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # First use, or evicted: a fresh stamp can't collide with pages cached under the old one
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def page_key(category_ids, query_params):
+    category_ids = sorted(set(category_ids))
+    params = sorted((key, sorted(query_params.getlist(key))) for key in query_params)
+    raw = json.dumps([category_ids, category_versions(category_ids), params])
+    return 'feed:page:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def get_page(key):
+    data = cache.get(key)
+    _count(HITS_KEY if data is not None else MISSES_KEY)
+    return data
+
+
+def set_page(key, data):
+    cache.set(key, data, settings.FEED_CACHE_TIMEOUT)
+
+
+def invalidate(*category_ids):
+    cache.set_many({VERSION_KEY.format(category_id): uuid.uuid4().hex for category_id in set(category_ids)}, None)
+
+
+def invalidate_on_commit(*category_ids):
+    # Now, so the rest of this transaction sees the change, and after commit, or a concurrent request could cache the
+    # old page again under the first new stamp
+    invalidate(*category_ids)
+    transaction.on_commit(lambda: invalidate(*category_ids))
+
+
+def stats():
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': counts.get(HITS_KEY, 0), 'misses': counts.get(MISSES_KEY, 0)}
+
+
+def _count(key):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr, losing one count is fine
+        pass
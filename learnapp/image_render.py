@@ -0,0 +1,25 @@
+"""Renders image variants, in the image_variants process pool.
+
+Only imports Pillow, so spawned worker processes load it without setting up Django.
+"""
+import io
+
+
+def render(data, variants):
+    """{label: (WebP bytes, width, height)} of the image in data, for every {label: {'width', 'quality'}} variant.
+
+    Each variant fits in a width x width box and is never larger than the original.
+    """
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    rendered = {}
+    for label, spec in variants.items():
+        variant = image.copy()
+        variant.thumbnail((spec['width'], spec['width']))
+        buffer = io.BytesIO()
+        variant.save(buffer, 'WEBP', quality=spec['quality'], method=4)
+        rendered[label] = (buffer.getvalue(), variant.width, variant.height)
+    return rendered
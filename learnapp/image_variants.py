@@ -0,0 +1,101 @@
+"""Resized WebP variants of uploaded images, so post lists don't ship the full size originals.
+
+Once an upload commits, schedule() hands the image to a pipeline thread. The thread has a process pool render every
+IMAGE_VARIANTS entry (Pillow is CPU bound), stores them next to the original and records them on the FileRef, where
+PostSerializer finds them by the post's image URL. Without Pillow, or with IMAGE_VARIANTS empty, uploads get no
+variants and posts only serve the original.
+"""
+import importlib.util
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Now
+from . import blob_deletions, feed_cache
+from .image_render import render
+from .models import FileRef, Post
+from .storage_backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def enabled():
+    return bool(settings.IMAGE_VARIANTS) and importlib.util.find_spec('PIL') is not None
+
+
+def _pool(kind):
+    with _pools_lock:
+        if kind not in _pools:
+            if kind == 'render':
+                # Spawned, forking a worker that runs threads can copy a held lock into the child
+                _pools[kind] = ProcessPoolExecutor(settings.IMAGE_PIPELINE_WORKERS,
+                                                   mp_context=multiprocessing.get_context('spawn'))
+            else:
+                _pools[kind] = ThreadPoolExecutor(settings.IMAGE_PIPELINE_WORKERS, thread_name_prefix='image-variants')
+        return _pools[kind]
+
+
+def schedule(file_ref, file):
+    """Make the variants of file, the uploaded image file_ref was created for, after the current transaction commits."""
+    if not enabled() or file.file is None:
+        return
+    file.seek(0)
+    data = file.read()
+    transaction.on_commit(lambda: _pool('store').submit(process, file_ref.id, data))
+
+
+def process(file_ref_id, data):
+    try:
+        rendered = _pool('render').submit(render, data, settings.IMAGE_VARIANTS).result()
+        file_ref = FileRef.objects.filter(id=file_ref_id).first()
+        if file_ref is None:
+            return
+        backend = get_backend()
+        variants = {}
+        for label, (content, width, height) in rendered.items():
+            name = backend.put(f"{file_ref.name}.{label}.webp", io.BytesIO(content))
+            variants[label] = {'name': name, 'url': backend.url(name), 'width': width, 'height': height}
+        # Every reference to the same stored content, uploads reusing it meanwhile copied the empty variants
+        sharing = FileRef.objects.filter(id=file_ref_id)
+        if file_ref.sha256:
+            sharing = FileRef.objects.filter(sha256=file_ref.sha256, name=file_ref.name)
+        if not sharing.update(variants=variants):
+            # Deleted while rendering
+            blob_deletions.enqueue([variant['name'] for variant in variants.values()])
+            return
+        # Posts already showing the image must drop the cached representations without variants
+        posts = Post.objects.filter(author_id__in=sharing.values('author_id'), image=file_ref.url)
+        category_ids = list(posts.values_list('category_id', flat=True))
+        if category_ids:
+            posts.update(updated=Now())
+            feed_cache.invalidate(*category_ids)
+    except Exception:
+        logger.exception('Image variants of FileRef %s failed', file_ref_id)
+    finally:
+        connection.close()
+
+
+def variant_urls(image_urls):
+    """{image url: {label: variant url}} for the images that have variants, in one query."""
+    image_urls = {url for url in image_urls if url}
+    if not image_urls:
+        return {}
+    return {
+        url: {label: variant['url'] for label, variant in variants.items()}
+        for url, variants in FileRef.objects.filter(url__in=image_urls).exclude(variants={}).values_list(
+            'url', 'variants')
+    }
+
+
+def merge(representations):
+    """Set image_variants on serialized posts (dicts with an 'image'), in place."""
+    found = variant_urls(representation['image'] for representation in representations)
+    for representation in representations:
+        representation['image_variants'] = found.get(representation['image'], {})
+    return representations
@@ -0,0 +1,151 @@
+"""Helpers shared by the bench_* and check_* management commands and the tests."""
+import os
+import statistics
+import time
+import uuid
+from contextlib import contextmanager
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test.client import BOUNDARY, encode_multipart
+from requests import Session
+from requests.adapters import HTTPAdapter
+from rest_framework.test import APIRequestFactory, force_authenticate
+from accounts.models import UserProfile
+from learnapp.models import Category
+from learnapp import storage_backends
+from learnapp.storage_backends import StorageBackend
+
+UserModel = get_user_model()
+
+
+@contextmanager
+def rollback():
+    """Run the block in a transaction that is always rolled back, so benchmarks leave no data behind."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def bench_user(name='bench', categories=()):
+    user = UserModel.objects.create_user(email=f'{name}@bench.local', password=None, username=name)
+    profile = UserProfile.objects.create(user=user)
+    profile.category.add(*categories)
+    return user
+
+
+def bench_category(name='Bench'):
+    return Category.objects.create(name=name)
+
+
+def seed_posts(author, category, count, tags=100, words=1000):
+    """Insert count posts in one statement, newest first, with spread out scores, tags and title words.
+
+    Every title has two words out of w0..w{words - 1}, so a single word matches about 2 / words of the posts.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO learnapp_post (author_id, category_id, title, description, resources, tags, created, updated,
+                                       score, upvotes, downvotes)
+            SELECT %(author)s, %(category)s,
+                   'Bench post ' || g || ' w' || (g %% %(words)s) || ' w' || ((g / %(words)s) %% %(words)s),
+                   'Generated for benchmarking', '{}',
+                   ARRAY['tag' || (g %% %(tags)s), 'tag' || ((g / %(tags)s) %% %(tags)s)],
+                   now() - g * interval '1 second', now() - g * interval '1 second',
+                   (g::bigint * 7919) %% 201 - 100, 0, 0
+            FROM generate_series(1, %(count)s) AS g
+        """, {'author': author.id, 'category': category.id, 'count': count, 'tags': tags, 'words': words})
+        cursor.execute("ANALYZE learnapp_post")
+
+
+def seed_users(count):
+    """Insert count users in one statement, named bench<n><10 hex digits> so substrings spread like real names."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO accounts_user (password, is_superuser, first_name, last_name, is_staff, is_active,
+                                       date_joined, username, email)
+            SELECT '!', false, '', '', false, true, now(),
+                   'bench' || g || substr(md5(g::text), 1, 10), 'bench' || g || '@seed.bench.local'
+            FROM generate_series(1, %(count)s) AS g
+        """, {'count': count})
+        cursor.execute("ANALYZE accounts_user")
+
+
+def timed(fn, repeat):
+    """Call fn repeat times and return the (median, p95, p99) wall time in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+    return statistics.median(samples), percentile(0.95), percentile(0.99)
+
+
+def api_request(user, path='/', **params):
+    """Build an authenticated GET request, to be passed to view.as_view() or view.initialize_request()."""
+    request = APIRequestFactory().get(path, params)
+    force_authenticate(request, user=user)
+    return request
+
+
+def image_bodies(size):
+    """A function returning multipart bodies that upload a size byte 'file', with new content every call, so uploads
+    aren't deduplicated. Send them as MULTIPART_CONTENT."""
+    content = os.urandom(size)
+    marker = content[:16]
+    body = encode_multipart(BOUNDARY, {'file': SimpleUploadedFile('bench.jpg', content, content_type='image/jpeg')})
+    return lambda: body.replace(marker, uuid.uuid4().bytes, 1)
+
+
+class FakeStorageBackend(StorageBackend):
+    """Stands in for FirebaseBackend without pyrebase or the network: puts read the data and drop it.
+
+    Builds the same HTTP sessions, and BENCH_STORAGE_INIT_MS stands in for what importing pyrebase and loading the
+    service account costs.
+    """
+
+    def __init__(self):
+        time.sleep(float(os.environ.get('BENCH_STORAGE_INIT_MS', 0)) / 1000)
+        adapter = HTTPAdapter(pool_maxsize=settings.STORAGE_HTTP_POOL_SIZE, max_retries=3)
+        self.sessions = [Session(), Session()]
+        for session in self.sessions:
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
+    def new_key(self):
+        return uuid.uuid4().hex
+
+    def put(self, name, data):
+        # Whatever put gets is read to the end, like an upload would
+        if hasattr(data, 'read'):
+            while data.read(self.chunk_size):
+                pass
+        else:
+            for _ in data:
+                pass
+        return name
+
+    def url(self, name):
+        return f'https://storage.bench.local/{name}'
+
+    def delete(self, name):
+        pass
+
+    def list(self):
+        return [f'static/{number}.jpg' for number in range(1, 10)] + ['images/bench']
+
+
+@contextmanager
+def storage_backend(backend):
+    """Serve get_backend() from backend within the block."""
+    previous, storage_backends._backend = storage_backends._backend, backend
+    try:
+        yield backend
+    finally:
+        storage_backends._backend = previous
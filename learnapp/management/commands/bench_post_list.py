@@ -0,0 +1,49 @@
+from urllib.parse import parse_qs, urlparse
+from django.core.management.base import BaseCommand
+from learnapp.management.bench import bench_category, bench_user, rollback, seed_posts, timed, api_request
+from learnapp import feed_cache
+from learnapp.views import PostListView
+
+
+class Command(BaseCommand):
+    help = 'Time PostListView pages for growing post counts. All seeded data is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--query', default='rating')
+        parser.add_argument('--q', help='Full text search terms')
+        parser.add_argument('--categories', type=int, default=3, help='Followed categories the posts are spread over')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--depth', type=int, default=0, help='Time the page reached after following N cursors')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--cached', action='store_true', help='Let requests hit the feed cache')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"query={options['query']} page_size={options['page_size']} categories={options['categories']} "
+            f"depth={options['depth']} q={options['q']} cached={options['cached']}"
+        )
+        view = PostListView.as_view()
+        for size in options['sizes']:
+            with rollback():
+                categories = [bench_category(f'Bench {i}') for i in range(options['categories'])]
+                user = bench_user(categories=categories)
+                for category in categories:
+                    seed_posts(user, category, size // len(categories))
+
+                params = {'query': options['query'], 'page_size': options['page_size']}
+                if options['q']:
+                    params['q'] = options['q']
+                for _ in range(options['depth']):
+                    next_link = view(api_request(user, **params)).data['next']
+                    if not next_link:
+                        break
+                    params['cursor'] = parse_qs(urlparse(next_link).query)['cursor'][0]
+
+                def request():
+                    if not options['cached']:
+                        feed_cache.invalidate(*[category.id for category in categories])
+                    view(api_request(user, **params)).render()
+
+                median, p95, p99 = timed(request, options['repeat'])
+            self.stdout.write(f"{size:>10} posts  median {median:8.2f} ms  p95 {p95:8.2f} ms  p99 {p99:8.2f} ms")
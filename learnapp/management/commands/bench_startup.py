@@ -0,0 +1,51 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter, like a worker booting. Eager builds the storage backend before the URLconf loads, which
+# is what importing the old FileStorageView did.
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from learnapp import storage_backends
+if sys.argv[1] == 'eager':
+    storage_backends.get_backend()
+from django.urls import get_resolver
+get_resolver().url_patterns
+ready = time.perf_counter()
+storage_backends.get_backend()
+print(json.dumps({'ready': (ready - start) * 1000, 'first_use': (time.perf_counter() - ready) * 1000}))
+"""
+
+
+class Command(BaseCommand):
+    help = ('Time a fresh worker from interpreter start until the URLconf is loaded, with the storage backend built '
+            'eagerly (as the old import-time initialization did) and lazily, and time the first use of the backend. '
+            'Uses a fake backend that takes --init-ms to build by default, pass --backend '
+            'learnapp.storage_backends.FirebaseBackend to time the real one.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', default='learnapp.management.bench.FakeStorageBackend')
+        parser.add_argument('--init-ms', type=float, default=300)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'elearning.settings'),
+                   STORAGE_BACKEND=options['backend'], BENCH_STORAGE_INIT_MS=str(options['init_ms']))
+        for mode in ('eager', 'lazy'):
+            runs = [self.run(mode, env) for _ in range(options['repeat'])]
+            self.stdout.write(
+                f"{mode:<6} ready median {statistics.median(run['ready'] for run in runs):8.2f} ms  "
+                f"first use median {statistics.median(run['first_use'] for run in runs):8.2f} ms"
+            )
+
+    def run(self, mode, env):
+        output = subprocess.run([sys.executable, '-c', CHILD, mode], env=env, cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        return json.loads(output.splitlines()[-1])
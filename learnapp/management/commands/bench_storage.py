@@ -0,0 +1,93 @@
+import os
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from rest_framework.test import APIRequestFactory, force_authenticate
+from learnapp import blob_deletions
+from learnapp.management.bench import bench_user, image_bodies, storage_backend
+from learnapp.storage import FileStorageView
+from learnapp.storage_backends import LocalBackend
+
+
+class Command(BaseCommand):
+    help = ('Concurrent uploads and deletes through FileStorageView on the local storage backend, in a temporary '
+            'directory, without image variants, then draining the deletion queue the deletes filled. The bench user '
+            'and its FileRefs are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--files', type=int, default=50, help='Files uploaded and deleted per thread')
+        parser.add_argument('--size', type=int, default=200000, help='Bytes per file')
+
+    def handle(self, *args, **options):
+        bodies = image_bodies(options['size'])
+        user = bench_user('storage')
+        view = FileStorageView.as_view()
+        try:
+            with tempfile.TemporaryDirectory() as root, override_settings(STORAGE_LOCAL_ROOT=root, IMAGE_VARIANTS={}), \
+                    storage_backend(LocalBackend()):
+                uploads, deletes, elapsed = self.run(view, user, bodies, options['threads'], options['files'])
+                start = time.perf_counter()
+                drained = 0
+                while True:
+                    deleted, failed = blob_deletions.drain(500)
+                    drained += deleted
+                    if deleted + failed < 500:
+                        break
+                drain_seconds = time.perf_counter() - start
+                left = sum(len(files) for _, _, files in os.walk(root))
+            for name, latencies in (('upload', uploads), ('delete', deletes)):
+                latencies.sort()
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                self.stdout.write(f"{name:<7} {len(latencies) / elapsed[name]:8.1f}/s  p99 {p99:8.2f} ms")
+            self.stdout.write(f"{'drain':<7} {drained / drain_seconds:8.1f}/s  ({drained} queued objects)")
+            if left:
+                self.stderr.write(f"{left} files left behind")
+        finally:
+            user.delete()
+
+    def run(self, view, user, bodies, threads, files):
+        uploads, deletes, urls = [], [], []
+        elapsed = {}
+        factory = APIRequestFactory()
+
+        def timed_request(method, request_body, samples):
+            request = factory.generic(method, '/api/learnapp/file/', request_body, content_type=MULTIPART_CONTENT)
+            force_authenticate(request, user=user)
+            start = time.perf_counter()
+            response = view(request)
+            samples.append((time.perf_counter() - start) * 1000)
+            return response
+
+        def upload():
+            try:
+                for _ in range(files):
+                    response = timed_request('POST', bodies(), uploads)
+                    if response.status_code == 201:
+                        urls.append(response.data['url'])
+            finally:
+                connection.close()
+
+        def delete(own):
+            try:
+                for url in own:
+                    timed_request('DELETE', encode_multipart(BOUNDARY, {'url': url}), deletes)
+            finally:
+                connection.close()
+
+        elapsed['upload'] = self.run_all([threading.Thread(target=upload) for _ in range(threads)])
+        elapsed['delete'] = self.run_all([threading.Thread(target=delete, args=(urls[i::threads],))
+                                          for i in range(threads)])
+        return uploads, deletes, elapsed
+
+    def run_all(self, workers):
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - start
@@ -0,0 +1,70 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.client import MULTIPART_CONTENT
+from rest_framework.test import APIRequestFactory, force_authenticate
+from learnapp.management.bench import FakeStorageBackend, bench_user, image_bodies, storage_backend
+from learnapp.storage import FileStorageView
+
+
+class Command(BaseCommand):
+    help = ('Concurrent image uploads through FileStorageView, spooled to a temporary file first (the old '
+            'FILE_UPLOAD_MAX_MEMORY_SIZE = 0 setup) and streamed to storage while the request is read. Storage is a '
+            'fake backend that reads and drops what it is sent, with image variants off. The bench user and its '
+            'FileRefs are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--uploads', type=int, default=16, help='Uploads per thread')
+        parser.add_argument('--size', type=int, default=2900000, help='Bytes per upload, just under the 3 MB limit')
+
+    def handle(self, *args, **options):
+        bodies = image_bodies(options['size'])
+        user = bench_user('uploader')
+        try:
+            with storage_backend(FakeStorageBackend()):
+                for streaming in (False, True):
+                    # The default upload handlers with a 0 byte memory limit put every upload in a temporary file
+                    with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=2621440 if streaming else 0, IMAGE_VARIANTS={}):
+                        view = FileStorageView.as_view(streaming_uploads=streaming)
+                        rate, p99 = self.run(view, user, bodies, options['threads'], options['uploads'])
+                    self.stdout.write(
+                        f"{'streaming' if streaming else 'temp file':<10} {rate * options['size'] / 2 ** 20:8.1f} MB/s"
+                        f"  {rate:7.1f} uploads/s  p99 {p99:8.2f} ms"
+                    )
+        finally:
+            user.delete()
+
+    def run(self, view, user, bodies, threads, uploads):
+        latencies = []
+        failures = []
+
+        def work():
+            factory = APIRequestFactory()
+            samples = []
+            try:
+                for _ in range(uploads):
+                    request = factory.generic('POST', '/api/learnapp/file/', bodies(), content_type=MULTIPART_CONTENT)
+                    force_authenticate(request, user=user)
+                    start = time.perf_counter()
+                    response = view(request)
+                    samples.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 201:
+                        failures.append(response.data)
+            finally:
+                connection.close()
+            latencies.extend(samples)
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        if failures:
+            self.stderr.write(f"{len(failures)} uploads failed, first: {failures[0]}")
+        latencies.sort()
+        return len(latencies) / elapsed, latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from accounts.views import UserListView
+from learnapp.management.bench import bench_user, rollback, seed_users, timed, api_request
+from learnapp.pagination import KeysetPagination
+
+
+class Command(BaseCommand):
+    help = ('Time UserListView pages, plain and with prefix/contains username searches, over seeded users and show '
+            'which username search index they use. All seeded data is rolled back.')
+    index_names = ['accounts_user_username_prefix_idx', 'accounts_user_username_trgm_idx']
+    searches = [
+        {},
+        {'q': 'bench4242'},
+        {'q': 'bench1234567'},
+        {'q': 'a1b2', 'match': 'contains'},
+        {'q': '4242c', 'match': 'contains'},
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        list_view = UserListView.as_view()
+        with rollback():
+            seed_users(options['users'])
+            user = bench_user()
+            for params in self.searches:
+                view = UserListView(args=(), kwargs={}, format_kwarg=None)
+                view.request = view.initialize_request(api_request(user, **params))
+                # The query the paginator runs for the first page
+                plan = view.get_queryset()[:KeysetPagination.page_size + 1].explain()
+                median, p95, p99 = timed(lambda: list_view(api_request(user, **params)).render(), options['repeat'])
+                index = next((name for name in self.index_names if name in plan), 'no search index')
+                self.stdout.write(f"{str(params):<40} median {median:8.2f} ms  p99 {p99:8.2f} ms  {index}")
+                if options['verbosity'] > 1:
+                    self.stdout.write(plan)
@@ -0,0 +1,77 @@
+import random
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from learnapp import vote_buffer
+from learnapp.counters import put_post_vote
+from learnapp.management.bench import bench_category, bench_user
+from learnapp.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Many concurrent voters on one post through the vote put path, with the tallies written directly and '
+            'with the write-behind vote buffer. The threads need their own connections, so the seeded data is '
+            'committed and deleted afterwards. The buffer uses the configured cache, LocMemCache is fine here.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--voters', type=int, default=256)
+        parser.add_argument('--votes', type=int, default=200, help='Votes per thread')
+
+    def handle(self, *args, **options):
+        category = bench_category('Bench votes')
+        voters = [bench_user(f'voter{i}') for i in range(options['voters'])]
+        try:
+            post = Post.objects.create(author=voters[0], title='Bench votes', resources=[], category=category)
+            for buffered in (False, True):
+                with override_settings(VOTE_BUFFER_ENABLED=buffered):
+                    rate, p99 = self.run(post, voters, options['threads'], options['votes'])
+                    start = time.perf_counter()
+                    if buffered:
+                        vote_buffer.flush()
+                    flush_ms = (time.perf_counter() - start) * 1000
+                self.stdout.write(
+                    f"{'buffered' if buffered else 'direct':<9} {rate:9.0f} votes/s  p99 {p99:7.2f} ms"
+                    + (f"  flush {flush_ms:.2f} ms" if buffered else '')
+                )
+                self.check_tallies(post)
+        finally:
+            for voter in voters:
+                voter.delete()
+            category.delete()
+
+    def run(self, post, voters, threads, votes):
+        latencies = []
+
+        def work(seed):
+            rnd = random.Random(seed)
+            # Each thread votes for its own voters, so only the post row is shared
+            own = voters[seed::threads]
+            samples = []
+            try:
+                for _ in range(votes):
+                    start = time.perf_counter()
+                    put_post_vote(rnd.choice(own).id, post.id, rnd.choice([-1, 1, 1, 0]))
+                    samples.append((time.perf_counter() - start) * 1000)
+            finally:
+                connection.close()
+            latencies.extend(samples)
+
+        workers = [threading.Thread(target=work, args=(seed,)) for seed in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return len(latencies) / elapsed, latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+    def check_tallies(self, post):
+        stored = Post.objects.values_list('score', 'upvotes', 'downvotes').get(id=post.id)
+        votes = list(post.vote_set.values_list('vote', flat=True))
+        actual = (sum(votes), votes.count(1), votes.count(-1))
+        if stored != actual:
+            self.stderr.write(f"Tallies drifted: stored {stored}, votes {actual}")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from learnapp.management.bench import bench_category, bench_user, rollback, seed_posts, api_request
+from learnapp.pagination import KeysetPagination
+from learnapp.views import PostListView
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the tag searches of PostListView over seeded posts and fail unless they use the tags GIN index.'
+    index_name = 'post_tags_gin_idx'
+    searches = [
+        {'search': ['tag4321']},
+        {'search': ['tag4321', 'tag17']},
+        {'search_any': ['tag4321', 'tag8765']},
+        {'search': ['tag4321'], 'search_exclude': ['tag1']},
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--tags', type=int, default=10000, help='Distinct tags the seeded posts draw from')
+
+    def handle(self, *args, **options):
+        failures = []
+        with rollback():
+            category = bench_category()
+            user = bench_user(categories=[category])
+            seed_posts(user, category, options['posts'], tags=options['tags'])
+            for params in self.searches:
+                view = PostListView(args=(), kwargs={}, format_kwarg=None)
+                view.request = view.initialize_request(api_request(user, **params))
+                # The query the paginator runs for the first page
+                plan = view.get_queryset()[:KeysetPagination.page_size + 1].explain()
+                used = self.index_name in plan
+                self.stdout.write(f"{params}: {'uses ' + self.index_name if used else 'does NOT use the index'}")
+                if options['verbosity'] > 1 or not used:
+                    self.stdout.write(plan)
+                if not used:
+                    failures.append(params)
+        if failures:
+            raise CommandError(f"{len(failures)} tag searches don't use {self.index_name}")
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from learnapp import blob_deletions
+
+
+class Command(BaseCommand):
+    help = ('Delete the stored objects queued by file and post deletes, in batches. Drains the queue once, or every '
+            '--interval seconds until stopped. Several can run at once.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0)
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        while True:
+            self.drain(options['batch_size'])
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def drain(self, batch_size):
+        total_deleted = total_failed = 0
+        while True:
+            deleted, failed = blob_deletions.drain(batch_size)
+            total_deleted += deleted
+            total_failed += failed
+            if deleted + failed < batch_size:
+                break
+        self.stdout.write(f"deleted {total_deleted}, failed {total_failed}")
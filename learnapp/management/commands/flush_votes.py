@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from learnapp import feed_cache, vote_buffer
+from learnapp.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Move the buffered vote deltas (VOTE_BUFFER_ENABLED) to the Post and Comment rows in batched UPDATEs. '
+            'Runs once, or every --interval seconds until stopped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        while True:
+            self.flush(options['batch_size'])
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def flush(self, batch_size):
+        flushed = vote_buffer.flush(batch_size)
+        if flushed is None:
+            self.stdout.write('Another flush is running')
+            return
+        if flushed['post']:
+            # The UPDATE skips the Post signals, scores feed the rating and hot orderings
+            category_ids = Post.objects.filter(id__in=flushed['post']).values_list('category_id', flat=True).distinct()
+            feed_cache.invalidate(*category_ids)
+        self.stdout.write(', '.join(f"{kind}: flushed {len(deltas)}" for kind, deltas in flushed.items()))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from learnapp import backgrounds
+
+
+class Command(BaseCommand):
+    help = ('List the static backgrounds in storage and replace the cached manifest FileStorageView serves. Workers '
+            'only see it through a shared cache, with the default LocMemCache they refresh on their own.')
+
+    def handle(self, *args, **options):
+        manifest = backgrounds.refresh()
+        self.stdout.write(f"{len(manifest['urls'])} backgrounds, etag {manifest['etag']}")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, FloatField, Func, Max
+from learnapp import feed_cache
+from learnapp.models import Post
+
+
+class HotRank(Func):
+    function = 'learnapp_hot_rank'
+    output_field = FloatField()
+
+
+class Command(BaseCommand):
+    help = ('Recompute Post.hot in id batches. The learnapp_post_hot trigger keeps it current on every score change, '
+            'schedule this as a safety net and run it after changing learnapp_hot_rank.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+        rank = HotRank(F('score'), F('created'))
+        updated, category_ids = 0, set()
+        for start in range(0, last_id, batch_size):
+            # Each batch is its own short statement, only drifted rows are written
+            drifted = Post.objects.filter(id__gt=start, id__lte=start + batch_size).exclude(hot=rank)
+            category_ids.update(drifted.values_list('category_id', flat=True).distinct())
+            updated += drifted.update(hot=rank)
+        if category_ids:
+            # The UPDATE skips the Post signals, the hot feeds of these categories are stale
+            feed_cache.invalidate(*category_ids)
+        self.stdout.write(f"Post: refreshed {updated} hot ranks")
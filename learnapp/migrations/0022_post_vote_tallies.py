@@ -0,0 +1,44 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learnapp', '0021_auto_20211104_0103'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='downvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='upvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE learnapp_post AS post
+                SET score = tally.score, upvotes = tally.upvotes, downvotes = tally.downvotes
+                FROM (
+                    SELECT post_id,
+                           SUM(vote) AS score,
+                           COUNT(*) FILTER (WHERE vote = 1) AS upvotes,
+                           COUNT(*) FILTER (WHERE vote = -1) AS downvotes
+                    FROM learnapp_vote
+                    GROUP BY post_id
+                ) AS tally
+                WHERE post.id = tally.post_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:43
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes to learnapp_post
+    atomic = False
+
+    dependencies = [
+        ('learnapp', '0022_post_vote_tallies'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(fields=['category', '-score', '-id'], name='post_category_score_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(fields=['-score', '-id'], name='post_score_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:44
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes to learnapp_post
+    atomic = False
+
+    dependencies = [
+        ('learnapp', '0023_post_score_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(fields=['category', '-created', '-id'], name='post_category_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(fields=['-created', '-id'], name='post_created_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:47
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to learnapp_post
+    atomic = False
+
+    dependencies = [
+        ('learnapp', '0024_post_created_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags'], name='post_tags_gin_idx'),
+        ),
+    ]
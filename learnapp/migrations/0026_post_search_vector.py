@@ -0,0 +1,48 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:49
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('pg_catalog.english', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.english', coalesce({row}description, '')), 'B')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learnapp', '0025_post_tags_gin_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Kept up to date in the database so saves, bulk updates and raw inserts all stay searchable
+        migrations.RunSQL(
+            sql=f"""
+                CREATE FUNCTION learnapp_post_search_vector() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER learnapp_post_search_vector
+                BEFORE INSERT OR UPDATE OF title, description ON learnapp_post
+                FOR EACH ROW EXECUTE PROCEDURE learnapp_post_search_vector();
+            """,
+            reverse_sql="""
+                DROP TRIGGER learnapp_post_search_vector ON learnapp_post;
+                DROP FUNCTION learnapp_post_search_vector();
+            """,
+        ),
+        migrations.RunSQL(
+            sql=f"UPDATE learnapp_post SET search_vector = {SEARCH_VECTOR.format(row='')}",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # The index is built concurrently in 0036
+    ]
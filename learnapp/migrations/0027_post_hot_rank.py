@@ -0,0 +1,50 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learnapp', '0026_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        # Reddit style hot rank: every 10x more net votes is worth as much as being 12.5 hours (45000 s) newer.
+        # Epoch is 2021-01-01 to keep the offsets small.
+        migrations.RunSQL(
+            sql="""
+                CREATE FUNCTION learnapp_hot_rank(score integer, created timestamp with time zone)
+                RETURNS double precision AS $$
+                    SELECT sign(score) * log(greatest(abs(score), 1))
+                           + (extract(epoch FROM created) - 1609459200) / 45000
+                $$ LANGUAGE sql IMMUTABLE;
+
+                CREATE FUNCTION learnapp_post_hot() RETURNS trigger AS $$
+                BEGIN
+                    NEW.hot := learnapp_hot_rank(NEW.score, NEW.created);
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER learnapp_post_hot
+                BEFORE INSERT OR UPDATE OF score, created ON learnapp_post
+                FOR EACH ROW EXECUTE PROCEDURE learnapp_post_hot();
+            """,
+            reverse_sql="""
+                DROP TRIGGER learnapp_post_hot ON learnapp_post;
+                DROP FUNCTION learnapp_post_hot();
+                DROP FUNCTION learnapp_hot_rank(integer, timestamp with time zone);
+            """,
+        ),
+        migrations.RunSQL(
+            sql="UPDATE learnapp_post SET hot = learnapp_hot_rank(score, created)",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # The indexes are built concurrently in 0037
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.13 on 2026-10-18 09:14
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learnapp', '0027_post_hot_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
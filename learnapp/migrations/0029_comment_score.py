@@ -0,0 +1,31 @@
+# Generated by Django 3.1.13 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learnapp', '0028_updated_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE learnapp_comment AS comment
+                SET score = tally.score
+                FROM (
+                    SELECT comment_id, SUM(vote) AS score
+                    FROM learnapp_votecomment
+                    GROUP BY comment_id
+                ) AS tally
+                WHERE comment.id = tally.comment_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1.13 on 2026-10-18 09:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to learnapp_comment
+    atomic = False
+
+    dependencies = [
+        ('learnapp', '0029_comment_score'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='comment',
+            index=models.Index(fields=['post', '-score', '-id'], name='comment_post_score_idx'),
+        ),
+    ]
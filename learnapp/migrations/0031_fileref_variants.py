@@ -0,0 +1,18 @@
+# Generated by Django 3.1.13 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learnapp', '0030_comment_score_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileref',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1.13 on 2026-10-18 14:05
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking uploads
+    atomic = False
+
+    dependencies = [
+        ('learnapp', '0031_fileref_variants'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='fileref',
+            index=models.Index(fields=['url'], name='fileref_url_idx'),
+        ),
+    ]
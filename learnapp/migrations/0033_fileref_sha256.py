@@ -0,0 +1,23 @@
+# Generated by Django 3.1.13 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learnapp', '0032_fileref_url_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileref',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='fileref',
+            name='references',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1.13 on 2026-10-18 15:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking uploads
+    atomic = False
+
+    dependencies = [
+        ('learnapp', '0033_fileref_sha256'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='fileref',
+            index=models.Index(fields=['sha256'], name='fileref_sha256_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.13 on 2026-10-18 09:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learnapp', '0034_fileref_sha256_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobDeletion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=254)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='blobdeletion',
+            index=models.Index(fields=['next_attempt', 'id'], name='blobdeletion_next_idx'),
+        ),
+    ]
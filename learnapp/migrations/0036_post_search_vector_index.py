@@ -0,0 +1,21 @@
+# Generated by Django 3.1.13 on 2026-10-18 09:40
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to learnapp_post
+    atomic = False
+
+    dependencies = [
+        ('learnapp', '0035_blobdeletion'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='post_search_vector_gin_idx'),
+        ),
+    ]
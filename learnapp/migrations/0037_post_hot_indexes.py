@@ -0,0 +1,24 @@
+# Generated by Django 3.1.13 on 2026-10-18 09:45
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes to learnapp_post
+    atomic = False
+
+    dependencies = [
+        ('learnapp', '0036_post_search_vector_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(fields=['category', '-hot', '-id'], name='post_category_hot_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(fields=['-hot', '-id'], name='post_hot_idx'),
+        ),
+    ]
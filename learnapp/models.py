@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
-from django.db.models import Avg, Count, Sum
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import Avg, Count, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Now
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from .validators import tag_validator
 
@@ -22,11 +26,38 @@ class FileRef(models.Model):
     author = models.ForeignKey(UserModal, on_delete=models.CASCADE)
     name = models.CharField(max_length=254)
     url = models.URLField()
+    # {label: {'name', 'url', 'width', 'height'}} of the resized copies, filled in by image_variants
+    variants = models.JSONField(default=dict, blank=True)
+    # Uploads of the same content share the stored object, each user's FileRef counts their uploads of it
+    sha256 = models.CharField(max_length=64, null=True, blank=True)
+    references = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['url'], name='fileref_url_idx'),
+            models.Index(fields=['sha256'], name='fileref_sha256_idx'),
+        ]
 
     def __str__(self):
         return f"#{self.id} {self.name} {self.url}"
 
 
+class BlobDeletion(models.Model):
+    """A stored object to delete, queued with its last FileRef's delete and drained by the delete_blobs command."""
+    name = models.CharField(max_length=254)
+    created = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt', 'id'], name='blobdeletion_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.name}"
+
+
 class Category(models.Model):
     name = models.CharField(max_length=254)
 
@@ -37,6 +68,21 @@ class Category(models.Model):
         return f"#{self.id} {self.name}"
 
 
+class PostQuerySet(models.QuerySet):
+    def with_related(self):
+        """Join everything PostSerializer reads, so serializing a page of posts is a single query.
+
+        Category names come from category_cache, so categories aren't joined.
+        """
+        return self.select_related('author')
+
+
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    def get_queryset(self):
+        # The search vector is only read inside SQL, don't ship it to Python with every post
+        return super().get_queryset().defer('search_vector')
+
+
 class Post(models.Model):
     author = models.ForeignKey(UserModal, on_delete=models.CASCADE)
     title = models.CharField(max_length=254, null=False, blank=False)
@@ -46,22 +92,83 @@ class Post(models.Model):
     tags = ArrayField(models.CharField(max_length=30, validators=[tag_validator]), size=10, null=True, blank=True)
     image = models.URLField(null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
+    # Bumped on edits and votes, drives conditional GETs of the detail view
+    updated = models.DateTimeField(auto_now=True)
+    # Vote tallies, kept in sync with the Vote table by learnapp.counters
+    score = models.IntegerField(default=0)
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
+    # log10 of the score plus the age as a fixed offset (see learnapp_hot_rank in migration 0027). Older posts never
+    # decay, newer ones start higher, so the rank only changes with the score and is kept by a trigger
+    hot = models.FloatField(default=0, editable=False)
+    # Weighted title (A) + description (B), maintained by the learnapp_post_search_vector trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = PostManager()
 
-    @property
-    def score(self):
-        score = self.vote_set.aggregate(sum=Sum('vote'))['sum']
-        return score or 0
+    class Meta:
+        indexes = [
+            # Rating feed: one category is a range scan, several categories walk the global index
+            models.Index(fields=['category', '-score', '-id'], name='post_category_score_idx'),
+            models.Index(fields=['-score', '-id'], name='post_score_idx'),
+            # Newest feed, same layout
+            models.Index(fields=['category', '-created', '-id'], name='post_category_created_idx'),
+            models.Index(fields=['-created', '-id'], name='post_created_idx'),
+            # Hot feed, same layout
+            models.Index(fields=['category', '-hot', '-id'], name='post_category_hot_idx'),
+            models.Index(fields=['-hot', '-id'], name='post_hot_idx'),
+            # Tag search: @> and && on tags
+            GinIndex(fields=['tags'], name='post_tags_gin_idx'),
+            # Full text search on title and description
+            GinIndex(fields=['search_vector'], name='post_search_vector_gin_idx'),
+        ]
 
     def __str__(self):
         return f"#{self.id} {self.title} - by {self.author}"
 
 
+class CollectionQuerySet(models.QuerySet):
+    def with_posts(self):
+        """Prefetch the posts with what PostSerializer reads, so serializing collections takes constant queries."""
+        return self.select_related('author').prefetch_related(Prefetch('posts', queryset=Post.objects.with_related()))
+
+    def with_summary(self):
+        """Annotate post_count and cover_image (the image of the latest added post that has one), without the posts."""
+        covers = Collection.posts.through.objects.filter(collection=OuterRef('pk')).exclude(
+            post__image__isnull=True).exclude(post__image='').order_by('-id').values('post__image')[:1]
+        return self.select_related('author').annotate(post_count=Count('posts'), cover_image=Subquery(covers))
+
+    def add_posts(self, post_ids):
+        """Add every post to every collection of the queryset in one INSERT, skipping posts they already hold."""
+        through = Collection.posts.through
+        collection_ids = list(self.values_list('id', flat=True))
+        through.objects.bulk_create(
+            [through(collection_id=collection_id, post_id=post_id)
+             for collection_id in collection_ids for post_id in set(post_ids)],
+            ignore_conflicts=True,
+        )
+        # Bulk writes skip m2m_changed, stamp the collections here
+        return Collection.objects.filter(id__in=collection_ids).update(updated=Now())
+
+    def remove_posts(self, post_ids):
+        """Remove the posts from every collection of the queryset with one DELETE on the through table."""
+        memberships = Collection.posts.through.objects.filter(collection__in=self.values('id'), post_id__in=post_ids)
+        with transaction.atomic():
+            # Stamp first, the memberships are gone afterwards
+            Collection.objects.filter(id__in=memberships.values('collection_id')).update(updated=Now())
+            return memberships.delete()[0]
+
+
 class Collection(models.Model):
     author = models.ForeignKey(UserModal, on_delete=models.CASCADE)
     title = models.CharField(max_length=254, null=False, blank=False)
     description = models.TextField(null=True, blank=True)
     posts = models.ManyToManyField(Post, blank=True)
     created = models.DateTimeField(auto_now_add=True)
+    # Bumped on edits and membership changes, drives conditional GETs of the detail view
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = CollectionQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created"]
@@ -93,11 +200,14 @@ class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     body = models.TextField(null=False, blank=False)
     created = models.DateTimeField(auto_now_add=True)
+    # Sum of comment_votes, kept in step by the vote views (see counters.py)
+    score = models.IntegerField(default=0)
 
-    @property
-    def score(self):
-        score = self.comment_votes.aggregate(sum=Sum('vote'))['sum']
-        return score or 0
+    class Meta:
+        indexes = [
+            # Backs the keyset-paginated comment list of a post
+            models.Index(fields=['post', '-score', '-id'], name='comment_post_score_idx'),
+        ]
 
     def __str__(self):
         return f"#{self.id} {self.author} commented on {self.post}"
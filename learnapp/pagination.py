@@ -0,0 +1,134 @@
+import base64
+import binascii
+import datetime
+import json
+from functools import reduce
+from operator import or_
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder cuts datetimes to milliseconds, a cursor needs them exact to compare against the column."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a unique, non-null ordering such as ('-created', '-id').
+
+    A page is fetched with a WHERE on the ordering values of the previous page's last row rather than an OFFSET, so
+    deep pages cost the same as the first one and rows inserted before the cursor never shift the following pages.
+    The ordering comes from view.get_ordering() or view.ordering and must end with a unique field.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 20
+    max_page_size = 100
+    ordering = ('-created', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.keyset_filter(position))
+            except (TypeError, ValueError, ValidationError):
+                # Tampered values that don't fit the ordering fields
+                raise NotFound(self.invalid_cursor_message)
+
+        # One extra row tells whether there is a next page without a COUNT
+        results = list(queryset[:self.page_size + 1])
+        self.next_position = None
+        if len(results) > self.page_size:
+            results = results[:self.page_size]
+            self.next_position = [self.position_value(results[-1], field) for field in self.ordering]
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, view):
+        if hasattr(view, 'get_ordering'):
+            return tuple(view.get_ordering())
+        return tuple(getattr(view, 'ordering', self.ordering))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def keyset_filter(self, position):
+        """Rows strictly after position: (a, b) < (x, y) expands to a <= x AND (a < x OR (a = x AND b < y))."""
+        branches = []
+        for index, field in enumerate(self.ordering):
+            branch = Q(**{f'{name}__exact': value for name, value in zip(self.field_names[:index], position)})
+            branch &= Q(**{self.after_lookup(field): position[index]})
+            branches.append(branch)
+        # The redundant bound on the leading field becomes an index condition, so the scan starts at the cursor
+        leading = self.ordering[0]
+        lookup = 'lte' if leading.startswith('-') else 'gte'
+        return Q(**{f'{self.field_names[0]}__{lookup}': position[0]}) & reduce(or_, branches)
+
+    @property
+    def field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    @staticmethod
+    def after_lookup(field):
+        return f"{field.lstrip('-')}__{'lt' if field.startswith('-') else 'gt'}"
+
+    @staticmethod
+    def position_value(instance, field):
+        return getattr(instance, field.lstrip('-'))
+
+    def encode_cursor(self, position):
+        # The ordering travels with the cursor so one taken from another ordering is rejected
+        payload = json.dumps({'o': self.ordering, 'p': position}, cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            ordering, position = tuple(payload['o']), payload['p']
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if ordering != self.ordering or not isinstance(position, list) or len(position) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
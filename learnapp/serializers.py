@@ -5,6 +5,7 @@ from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.contrib.auth import get_user_model
 from .models import Post, Collection, Vote, Category, Comment, VoteComment
 from .validators import tag_validator
+from . import category_cache, image_variants, vote_buffer
 from django.db.models import ObjectDoesNotExist, Avg, Count, Sum
 import time
 
@@ -22,8 +23,25 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ('id', 'name')
 
 
+class PendingVotesListSerializer(serializers.ListSerializer):
+    """Adds the buffered vote deltas (see vote_buffer) to a whole list with one cache read."""
+
+    def to_representation(self, data):
+        return vote_buffer.merge(self.child.vote_kind, super().to_representation(data))
+
+
+class PostListSerializer(PendingVotesListSerializer):
+    """Also adds the image variant URLs (see image_variants) of the whole list with one query."""
+
+    def to_representation(self, data):
+        return image_variants.merge(super().to_representation(data))
+
+
 class PostSerializer(serializers.ModelSerializer):
+    vote_kind = 'post'
     score = serializers.ReadOnlyField()
+    upvotes = serializers.ReadOnlyField()
+    downvotes = serializers.ReadOnlyField()
     author = serializers.ReadOnlyField(source='author.username')
     resources = serializers.ListField(child=serializers.URLField())
     tags = serializers.ListField(child=serializers.CharField())
@@ -64,7 +82,10 @@ class PostSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         response = super().to_representation(instance)
-        response['category'] = CategorySerializer(instance.category).data.get('name')
+        response['category'] = category_cache.name(instance.category_id)
+        if self.parent is None:
+            vote_buffer.merge(self.vote_kind, [response])
+            image_variants.merge([response])
         return response
 
     def update(self, instance, validated_data):
@@ -74,12 +95,20 @@ class PostSerializer(serializers.ModelSerializer):
         instance.category = validated_data.get('category', instance.category)
         instance.tags = validated_data.get('tags', instance.tags)
         instance.image = validated_data.get('image', instance.image)
-        instance.save()
+        # Only the edited columns, writing the loaded vote tallies back would undo votes cast meanwhile
+        instance.save(update_fields=['title', 'description', 'resources', 'category', 'tags', 'image', 'updated'])
         return instance
 
     class Meta:
         model = Post
-        fields = ('id', 'author', 'title', 'description', 'resources', 'category', 'tags', 'image', 'score')
+        fields = ('id', 'author', 'title', 'description', 'resources', 'category', 'tags', 'image', 'score', 'upvotes',
+                  'downvotes')
+        list_serializer_class = PostListSerializer
+
+
+class VotePutSerializer(serializers.Serializer):
+    """Body of the vote put endpoints, 0 clears the vote."""
+    vote = serializers.ChoiceField(choices=[-1, 0, 1])
 
 
 class VoteSerializer(serializers.ModelSerializer):
@@ -197,7 +226,41 @@ class CollectionSerializer(serializers.ModelSerializer):
         fields = ('id', 'author', 'title', 'description', 'posts')
 
 
+class CollectionSummarySerializer(serializers.ModelSerializer):
+    """Collection without its posts, for querysets from Collection.objects.with_summary()."""
+    author = serializers.ReadOnlyField(source='author.username')
+    post_count = serializers.ReadOnlyField()
+    cover_image = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Collection
+        fields = ('id', 'author', 'title', 'description', 'post_count', 'cover_image')
+
+
+class CollectionBatchSerializer(serializers.Serializer):
+    """Add or remove many posts across many of the user's collections at once."""
+    type = serializers.ChoiceField(choices=['post_add', 'post_remove'])
+    collections = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    posts = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_collections(self, value):
+        user = self.context['request'].user
+        value = set(value)
+        if Collection.objects.filter(author=user, id__in=value).count() != len(value):
+            raise ValidationError('Collection not found.')
+        return value
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        posts = set(attrs['posts'])
+        if attrs['type'] == 'post_add' and user.userprofile.saved_posts.filter(id__in=posts).count() != len(posts):
+            raise ValidationError('Only saved posts can be added or removed from collections.')
+        attrs['posts'] = posts
+        return attrs
+
+
 class CommentSerializer(serializers.ModelSerializer):
+    vote_kind = 'comment'
     score = serializers.ReadOnlyField()
     author = serializers.ReadOnlyField(source='author.username')
     read_only_fields = ('id', 'score', 'author')
@@ -228,6 +291,8 @@ class CommentSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         response = super().to_representation(instance)
+        if self.parent is None:
+            vote_buffer.merge(self.vote_kind, [response])
         return response
 
     def update(self, instance, validated_data):
@@ -239,6 +304,7 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ('id', 'author', 'post', 'body', 'score')
+        list_serializer_class = PendingVotesListSerializer
 
 
 class VoteCommentSerializer(serializers.ModelSerializer):
@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+from . import category_cache, feed_cache
+from .models import Category, Collection, Post
+
+
+# FEED CACHE
+@receiver(post_init, sender=Post)
+def remember_post_category(sender, instance, **kwargs):
+    # A post moved to another category leaves both feeds stale. Read through __dict__ so a deferred
+    # category_id isn't fetched for every instance.
+    instance._feed_category_id = instance.__dict__.get('category_id')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    # Votes invalidate from the vote views, a Vote receiver would turn off the fast delete of a post's votes
+    feed_cache.invalidate_on_commit(instance.category_id, instance._feed_category_id or instance.category_id)
+    instance._feed_category_id = instance.category_id
+
+
+# VERSION STAMPS
+@receiver(m2m_changed, sender=Collection.posts.through)
+def touch_collections(sender, instance, action, reverse, pk_set, **kwargs):
+    # Membership changes don't save the collection, bump its updated stamp by hand
+    if action in ('post_add', 'post_remove'):
+        collection_ids = pk_set if reverse else [instance.pk]
+    elif action == 'pre_clear':
+        collection_ids = instance.collection_set.values_list('id', flat=True) if reverse else [instance.pk]
+    else:
+        return
+    Collection.objects.filter(id__in=collection_ids).update(updated=Now())
+
+
+# CATEGORY CACHE
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, **kwargs):
+    # Now, so the rest of this transaction sees the change, and after commit, or another worker could cache the old
+    # table again under the first new stamp
+    category_cache.invalidate()
+    transaction.on_commit(category_cache.invalidate)
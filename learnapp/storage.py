@@ -1,9 +1,18 @@
-import pyrebase
-from decouple import config
-import os
+import hashlib
+import io
+import queue
 import re
+import threading
 from django.conf import settings
-from .models import FileRef
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from . import backgrounds, blob_deletions, image_variants
+from .models import FileRef, Post
+from .storage_backends import get_backend
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
@@ -14,29 +23,181 @@ from django.utils.decorators import method_decorator
 from rest_framework.exceptions import PermissionDenied, ValidationError
 
 
+# UPLOADS
+IMAGE_MAX_SIZE = 3000000
+UPLOAD_STALL_TIMEOUT = 60
+
+
+class UploadAborted(Exception):
+    pass
+
+
+class StreamedImage(UploadedFile):
+    """An uploaded image StreamingImageUploadHandler sent to storage, with its sha256.
+
+    The upload is held open before its end, store() completes it and discard() breaks it off. Readable only when the
+    handler kept the content, for the image variant pipeline.
+    """
+
+    def __init__(self, upload, sha256, name, content_type, size, charset, content_type_extra=None, content=None):
+        file = io.BytesIO(content) if content is not None else None
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.upload = upload
+        self.sha256 = sha256
+
+    def store(self):
+        """Complete the upload, returns the stored name and URL."""
+        stored_name = self.upload.finish()
+        return stored_name, get_backend().url(stored_name)
+
+    def discard(self):
+        self.upload.abort()
+
+
+class _StreamingUpload:
+    """Puts one object to storage from a background thread, fed chunk by chunk as the request body is read."""
+
+    def __init__(self, path):
+        self.path = path
+        self.result = None
+        self.error = None
+        # A few chunks of slack, a slower backend holds the request back instead of piling chunks up in memory
+        self.chunks = queue.Queue(maxsize=4)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            self.result = get_backend().put(self.path, self.stream())
+        except Exception as e:
+            self.error = e
+
+    def stream(self):
+        while True:
+            try:
+                chunk = self.chunks.get(timeout=UPLOAD_STALL_TIMEOUT)
+            except queue.Empty:
+                # The request died without telling the handler
+                raise UploadAborted(self.path)
+            if chunk is None:
+                return
+            if isinstance(chunk, UploadAborted):
+                raise chunk
+            yield chunk
+
+    def send(self, chunk):
+        while True:
+            try:
+                self.chunks.put(chunk, timeout=1)
+                return
+            except queue.Full:
+                if not self.thread.is_alive():
+                    raise self.error or UploadAborted(self.path)
+
+    def finish(self):
+        self.send(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def abort(self):
+        # Breaking off the request body leaves no object behind
+        if self.thread.is_alive():
+            self.send(UploadAborted(self.path))
+        self.thread.join()
+
+
+class StreamingImageUploadHandler(FileUploadHandler):
+    """Sends image uploads to storage as they arrive, without a temporary file or the whole file in memory.
+
+    Files that aren't images, or reach IMAGE_MAX_SIZE, are dropped from request.FILES as soon as that shows.
+    """
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.upload = None
+        if not re.match('image/', content_type or '') or (content_length or 0) >= IMAGE_MAX_SIZE:
+            raise SkipFile
+        self.size = 0
+        self.hash = hashlib.sha256()
+        # The image variant pipeline needs the whole image once it is stored
+        self.chunks = [] if image_variants.enabled() else None
+        self.upload = _StreamingUpload(f"images/{get_backend().new_key()}")
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size >= IMAGE_MAX_SIZE:
+            self.upload.abort()
+            self.upload = None
+            raise SkipFile
+        self.upload.send(raw_data)
+        self.hash.update(raw_data)
+        if self.chunks is not None:
+            self.chunks.append(raw_data)
+
+    def file_complete(self, file_size):
+        if self.upload is None:
+            return None
+        # Left open, the view decides whether the content is new
+        upload, self.upload = self.upload, None
+        content = b''.join(self.chunks) if self.chunks is not None else None
+        return StreamedImage(upload, self.hash.hexdigest(), self.file_name, self.content_type, file_size, self.charset,
+                             self.content_type_extra, content)
+
+    def upload_complete(self):
+        # An upload the parser stopped partway, don't leave its thread waiting for the rest
+        if getattr(self, 'upload', None) is not None:
+            self.upload.abort()
+            self.upload = None
+
+
 # STORAGE
+def content_hash(file):
+    sha256 = hashlib.sha256()
+    for chunk in file.chunks():
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def lock_content(sha256):
+    """Hold off other uploads and deletes of the same content until the transaction ends."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [int(sha256[:15], 16)])
+
+
+def release_file(user, url):
+    """Drop one of user's references to url. With the last reference to it, the stored object and its variants are
+    queued for deletion (see blob_deletions), unless one of user's posts still shows it: then the FileRef stays with
+    no references and deleting that post releases it."""
+    with transaction.atomic():
+        file_ref = FileRef.objects.filter(url=url, author=user).first()
+        if file_ref is None:
+            if FileRef.objects.filter(url=url).exists():
+                raise PermissionError
+            raise FileRef.DoesNotExist
+        if file_ref.sha256:
+            lock_content(file_ref.sha256)
+            file_ref.refresh_from_db()
+        if file_ref.references > 1:
+            FileRef.objects.filter(id=file_ref.id).update(references=F('references') - 1)
+            return
+        if Post.objects.filter(author=user, image=url).exists():
+            FileRef.objects.filter(id=file_ref.id).update(references=0)
+            return
+        file_ref.delete()
+        sharing = FileRef.objects.filter(name=file_ref.name)
+        if file_ref.sha256:
+            sharing = sharing.filter(sha256=file_ref.sha256)
+        if not sharing.exists():
+            blob_deletions.enqueue([file_ref.name] + [variant['name'] for variant in file_ref.variants.values()])
+
+
 class FileStorageView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser]
-
-    # Configuration
-    config = {
-        "apiKey": config('fire_apiKey'),
-        "authDomain": config('fire_authDomain'),
-        "projectId": config('fire_projectId'),
-        "storageBucket": config('fire_storageBucket'),
-        "messagingSenderId": config('fire_messagingSenderId'),
-        "appId": config('fire_appId'),
-        "databaseURL": config('fire_databaseURL'),
-    }
-    firebase = pyrebase.initialize_app(config)
-    storage = firebase.storage()
-    db = firebase.database()
-
-    # For Service Account (pyrebase bug)
-    config['serviceAccount'] = os.path.join(settings.BASE_DIR, 'google-credentials.json')
-    firebase_super = pyrebase.initialize_app(config)
-    storage_super = firebase_super.storage()
+    # Stream uploads to storage while the request is read, instead of Django's memory/temporary file handlers
+    streaming_uploads = True
 
     def get(self, request):
         try:
@@ -44,10 +205,17 @@ class FileStorageView(APIView):
             print(files_type)
             if files_type == 'backgrounds':
                 print('Yes BG')
-                url_arr = self.static_files_getter()
-                return Response({
-                    "file": url_arr
-                }, status=status.HTTP_200_OK)
+                manifest = backgrounds.manifest()
+                if manifest is None:
+                    # The first manifest is still being listed, clients shouldn't keep this empty one
+                    response = Response({"file": []}, status=status.HTTP_200_OK)
+                    patch_cache_control(response, no_cache=True)
+                    return response
+                response = condition(etag_func=lambda *args, **kwargs: manifest['etag'])(
+                    lambda request: Response({"file": manifest['urls']}, status=status.HTTP_200_OK)
+                )(request)
+                patch_cache_control(response, private=True, max_age=settings.BACKGROUND_MANIFEST_MAX_AGE)
+                return response
             print('after OwO')
         except ValueError as e:
             print('First Exception')
@@ -58,11 +226,13 @@ class FileStorageView(APIView):
 
     def post(self, request):
         try:
+            if self.streaming_uploads:
+                request.upload_handlers[:] = [StreamingImageUploadHandler(request)]
             # Getting file
             file = request.FILES.get('file')
 
             # For images
-            if bool(re.match('image/', file.content_type)) and file.size < 3000000:
+            if file is not None and bool(re.match('image/', file.content_type)) and file.size < IMAGE_MAX_SIZE:
                 # # Using temp file path instead
                 # file_key = self.db.generate_key()
                 # default_storage.save(file_key, file)  # Temporarily storing it in default storage
@@ -71,13 +241,11 @@ class FileStorageView(APIView):
                 # uploadedImageURL = self.storage.child(f"images/{file_key}").get_url(uploadedImage['downloadTokens'])
                 # default_storage.delete(file_key)  # deleting from temporary storage
 
-                (file_name, file_url) = self.file_create_helper(file)
-                # Create a entry in FileRef for later reference
-                FileRef.objects.create(author=request.user, name=file_name, url=file_url)
+                file_ref = self.file_create_helper(file)
 
                 return Response({
                     "status": True,
-                    "url": file_url
+                    "url": file_ref.url
                 }, status=status.HTTP_201_CREATED)
             else:
                 raise ValueError('File should be image and less than 3MB.')
@@ -98,32 +266,50 @@ class FileStorageView(APIView):
             raise ValidationError(detail="Something went wrong.")
 
     def file_create_helper(self, file):
-        if bool(re.match('image/', file.content_type)) and file.size < 3000000:
-            file_key = self.db.generate_key()
-            file_path = file.temporary_file_path()
-            # Saving to firebase storage
-            uploadedImage = self.storage.child(f"images/{file_key}").put(file_path)
-            print(uploadedImage)
-            uploadedImageURL = self.storage.child(f"images/{file_key}").get_url()
-            return uploadedImage['name'], uploadedImageURL
+        """Store file unless the same content already is, and return the user's FileRef for it."""
+        if not (bool(re.match('image/', file.content_type)) and file.size < IMAGE_MAX_SIZE):
+            raise ValueError('File should be image and less than 3MB.')
+        sha256 = file.sha256 if isinstance(file, StreamedImage) else content_hash(file)
+        with transaction.atomic():
+            lock_content(sha256)
+            stored = FileRef.objects.filter(sha256=sha256).order_by('id')
+            shared = stored.first()
+            if shared is not None:
+                # Already stored, reuse the object
+                if isinstance(file, StreamedImage):
+                    file.discard()
+                own = stored.filter(author=self.request.user).first()
+                if own is not None:
+                    FileRef.objects.filter(id=own.id).update(references=F('references') + 1)
+                    return own
+                return FileRef.objects.create(author=self.request.user, name=shared.name, url=shared.url,
+                                              sha256=sha256, variants=shared.variants)
+
+            if isinstance(file, StreamedImage):
+                file_name, file_url = file.store()
+            else:
+                backend = get_backend()
+                file.seek(0)
+                # Saving to storage
+                file_name = backend.put(f"images/{backend.new_key()}", file)
+                file_url = backend.url(file_name)
+            # Create a entry in FileRef for later reference
+            file_ref = FileRef.objects.create(author=self.request.user, name=file_name, url=file_url, sha256=sha256)
+            # Thumbnails and WebP versions are made in the background
+            image_variants.schedule(file_ref, file)
+            return file_ref
 
     def file_delete_helper(self, url):
-        bucket = self.storage_super.bucket
-        file_ref = FileRef.objects.get(url=url)
-        if file_ref.author == self.request.user:
-            blob = bucket.blob(file_ref.name)
-            blob.delete()
-            file_ref.delete()
-        else:
-            raise PermissionError
+        release_file(self.request.user, url)
 
     def static_files_getter(self):
-        all_files = self.storage_super.child().list_files()
+        backend = get_backend()
+        all_files = backend.list()
         url_arr = []
-        for file in all_files:
+        for file_name in all_files:
             try:
-                if bool(re.match('static/[\d]{1}', file.name)):
-                    url_arr.append(self.storage_super.child(file.name).get_url())
+                if bool(re.match('static/[\d]{1}', file_name)):
+                    url_arr.append(backend.url(file_name))
             except Exception as e:
                 print(url_arr, e)
                 print('Static failed')
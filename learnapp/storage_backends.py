@@ -0,0 +1,161 @@
+"""Where uploaded files and static backgrounds are stored.
+
+FileStorageView only talks to a StorageBackend, settings.STORAGE_BACKEND picks which. Objects are named by a path
+like images/<key>, and every object has one absolute URL that stays the same until it is deleted.
+"""
+import os
+import tempfile
+import threading
+import uuid
+from decouple import config
+from django.conf import settings
+from django.utils.module_loading import import_string
+from urllib.parse import quote
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The process-wide storage backend, an instance of settings.STORAGE_BACKEND created by the first caller."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.STORAGE_BACKEND)()
+    return _backend
+
+
+class StorageBackend:
+    chunk_size = 64 * 2 ** 10
+
+    def new_key(self):
+        """A fresh, unique key to name an object by."""
+        raise NotImplementedError
+
+    def put(self, name, data):
+        """Store data, a file object or an iterable of byte chunks, as name. Returns the stored name."""
+        raise NotImplementedError
+
+    def url(self, name):
+        raise NotImplementedError
+
+    def delete(self, name):
+        """Delete name, an object that is already gone is fine."""
+        raise NotImplementedError
+
+    def list(self):
+        """Names of every stored object."""
+        raise NotImplementedError
+
+
+class FirebaseBackend(StorageBackend):
+    """Firebase storage through pyrebase, with the apps built on first use instead of while the URLconf loads."""
+
+    def __init__(self):
+        import pyrebase
+        from requests.adapters import HTTPAdapter
+
+        # Configuration
+        firebase_config = {
+            "apiKey": config('fire_apiKey'),
+            "authDomain": config('fire_authDomain'),
+            "projectId": config('fire_projectId'),
+            "storageBucket": config('fire_storageBucket'),
+            "messagingSenderId": config('fire_messagingSenderId'),
+            "appId": config('fire_appId'),
+            "databaseURL": config('fire_databaseURL'),
+        }
+        self.firebase = pyrebase.initialize_app(firebase_config)
+        self.db = self.firebase.database()
+        # generate_key keeps the last push time and random suffix on the Database object
+        self.db_lock = threading.Lock()
+
+        # For Service Account (pyrebase bug)
+        firebase_config['serviceAccount'] = os.path.join(settings.BASE_DIR, 'google-credentials.json')
+        self.firebase_super = pyrebase.initialize_app(firebase_config)
+        self.storage_super = self.firebase_super.storage()
+
+        # Each app mounts its own small pool, share one sized for every thread of the worker. Storage and database
+        # objects use their app's session, so they pick it up too.
+        adapter = HTTPAdapter(pool_maxsize=settings.STORAGE_HTTP_POOL_SIZE, max_retries=3)
+        for app in (self.firebase, self.firebase_super):
+            app.requests.mount('http://', adapter)
+            app.requests.mount('https://', adapter)
+
+    def new_key(self):
+        with self.db_lock:
+            return self.db.generate_key()
+
+    def put(self, name, data):
+        # child() sets the path on the Storage object itself, request and background threads each need their own.
+        # Without a service account that's cheap, and it shares the app's session.
+        return self.firebase.storage().child(name).put(data)['name']
+
+    def url(self, name):
+        return self.firebase.storage().child(name).get_url()
+
+    def delete(self, name):
+        try:
+            self.storage_super.bucket.blob(name).delete()
+        except Exception as e:
+            # NotFound, deleted by an earlier attempt
+            if getattr(e, 'code', None) != 404:
+                raise
+
+    def list(self):
+        return [file.name for file in self.storage_super.list_files()]
+
+
+class LocalBackend(StorageBackend):
+    """Objects are files under STORAGE_LOCAL_ROOT, served from STORAGE_LOCAL_URL (by Django itself with DEBUG on)."""
+
+    def __init__(self):
+        self.root = settings.STORAGE_LOCAL_ROOT
+        self.base_url = settings.STORAGE_LOCAL_URL
+
+    def path(self, name):
+        path = os.path.normpath(os.path.join(self.root, name))
+        if not path.startswith(os.path.join(os.path.normpath(self.root), '')):
+            raise ValueError(f"{name} is outside the storage root.")
+        return path
+
+    def new_key(self):
+        return uuid.uuid4().hex
+
+    def put(self, name, data):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written next to the target and renamed over it, so a broken off upload leaves nothing behind
+        fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.partial-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                if hasattr(data, 'read'):
+                    for chunk in iter(lambda: data.read(self.chunk_size), b''):
+                        file.write(chunk)
+                else:
+                    for chunk in data:
+                        file.write(chunk)
+            os.replace(partial, path)
+        except BaseException:
+            os.unlink(partial)
+            raise
+        return name
+
+    def url(self, name):
+        return self.base_url + quote(name)
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def list(self):
+        names = []
+        for directory, _, files in os.walk(self.root):
+            relative = os.path.relpath(directory, self.root)
+            for file in files:
+                if not file.startswith('.partial-'):
+                    names.append(file if relative == '.' else f"{relative.replace(os.sep, '/')}/{file}")
+        return names
@@ -1,3 +1,767 @@
-from django.test import TestCase
+import hashlib
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from accounts.views import SavedPostListView, UserProfileUpdateView
+from .counters import put_comment_vote, put_post_vote
+from .management.bench import FakeStorageBackend, api_request, bench_category, bench_user, rollback, seed_posts, \
+    storage_backend
+from .models import BlobDeletion, Category, Collection, Comment, FileRef, Post, Vote, VoteComment
+from .pagination import KeysetPagination
+from .storage import IMAGE_MAX_SIZE, StreamingImageUploadHandler, release_file
+from .views import CollectionDetailView, CollectionListView, CollectionPostListView, CommentListView, \
+    PostDeleteView, PostDetailView, PostListView
+from . import blob_deletions, category_cache, feed_cache, storage_backends, vote_buffer
 
-# Create your tests here.
+
+class CacheClearingTestCase(TestCase):
+    """Feed pages, version stamps and buffered votes live in the cache, which the test database doesn't roll back."""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+
+class QueryCountTests(CacheClearingTestCase):
+    """Every endpoint that serializes posts runs as many queries for a large result as for a small one.
+
+    A count that grows with the result means some query runs once per row.
+    """
+    small, large = 2, 20
+
+    def assertConstantQueries(self, endpoint):
+        counts = [self.count_queries(endpoint, rows) for rows in (self.small, self.large)]
+        self.assertEqual(counts[0], counts[1], f"{counts[0]} queries for {self.small} rows, {counts[1]} for "
+                                               f"{self.large}: some query runs once per row")
+
+    def count_queries(self, endpoint, rows):
+        with rollback():
+            view, request, kwargs = endpoint(rows)
+            with CaptureQueriesContext(connection) as queries:
+                response = view(request, **kwargs)
+                response.render()
+            self.assertEqual(response.status_code, 200, response.data)
+        return len(queries)
+
+    @staticmethod
+    def user_with_posts(rows):
+        # Posts by several authors in several categories, so per-row author/category lookups would show
+        categories = [bench_category(f'Bench {i}') for i in range(2)]
+        authors = [bench_user(f'bench{i}', categories) for i in range(2)]
+        for index in range(rows):
+            seed_posts(authors[index % 2], categories[index % 2], 1)
+        return authors[0], Post.objects.filter(category__in=categories)
+
+    def post_list(self, **params):
+        def endpoint(rows):
+            user, _ = self.user_with_posts(rows)
+            return PostListView.as_view(), api_request(user, page_size=rows, **params), {}
+        return endpoint
+
+    def test_post_list(self):
+        for query in ('newest', 'rating', 'hot'):
+            with self.subTest(query=query):
+                self.assertConstantQueries(self.post_list(query=query))
+
+    def test_post_list_search(self):
+        self.assertConstantQueries(self.post_list(q='bench'))
+
+    def test_post_detail(self):
+        def endpoint(rows):
+            user, posts = self.user_with_posts(rows)
+            return PostDetailView.as_view(), api_request(user), {'pk': posts.first().pk}
+        self.assertConstantQueries(endpoint)
+
+    def test_collection_list(self):
+        def endpoint(rows):
+            user, posts = self.user_with_posts(rows)
+            for index in range(rows):
+                Collection.objects.create(author=user, title=f'Bench {index}').posts.add(*posts)
+            return CollectionListView.as_view(), api_request(user), {}
+        self.assertConstantQueries(endpoint)
+
+    def test_collection_detail(self):
+        def endpoint(rows):
+            user, posts = self.user_with_posts(rows)
+            collection = Collection.objects.create(author=user, title='Bench')
+            collection.posts.add(*posts)
+            return CollectionDetailView.as_view(), api_request(user), {'pk': collection.pk}
+        self.assertConstantQueries(endpoint)
+
+    def test_collection_posts(self):
+        def endpoint(rows):
+            user, posts = self.user_with_posts(rows)
+            collection = Collection.objects.create(author=user, title='Bench')
+            collection.posts.add(*posts)
+            return CollectionPostListView.as_view(), api_request(user, page_size=rows), {'pk': collection.pk}
+        self.assertConstantQueries(endpoint)
+
+    def test_comment_list(self):
+        def endpoint(rows):
+            user, posts = self.user_with_posts(1)
+            post = posts.get()
+            commenters = [bench_user(f'commenter{i}') for i in range(2)]
+            for index in range(rows):
+                Comment.objects.create(author=commenters[index % 2], post=post, body='Bench', score=index % 5)
+            return CommentListView.as_view(), api_request(user, page_size=rows), {'pk': post.pk}
+        self.assertConstantQueries(endpoint)
+
+    def test_profile(self):
+        def endpoint(rows):
+            user, posts = self.user_with_posts(rows)
+            user.userprofile.saved_posts.add(*posts)
+            return UserProfileUpdateView.as_view(), api_request(user), {}
+        self.assertConstantQueries(endpoint)
+
+    def test_saved_posts(self):
+        def endpoint(rows):
+            user, posts = self.user_with_posts(rows)
+            user.userprofile.saved_posts.add(*posts)
+            return SavedPostListView.as_view(), api_request(user, page_size=rows), {}
+        self.assertConstantQueries(endpoint)
+
+
+class TagSearchPlanTests(TestCase):
+    """The tag searches of PostListView are written so the planner can answer them from the tags GIN index.
+
+    20k posts keep the suite fast, check_tag_search_plan verifies the same plans over 1M.
+    """
+    index_name = 'post_tags_gin_idx'
+
+    def test_tag_searches_use_gin_index(self):
+        category = bench_category()
+        user = bench_user(categories=[category])
+        seed_posts(user, category, 20000, tags=1000)
+        searches = [
+            {'search': ['tag432']},
+            {'search': ['tag432', 'tag17']},
+            {'search_any': ['tag432', 'tag876']},
+            {'search': ['tag432'], 'search_exclude': ['tag1']},
+        ]
+        for params in searches:
+            with self.subTest(**params):
+                view = PostListView(args=(), kwargs={}, format_kwarg=None)
+                view.request = view.initialize_request(api_request(user, **params))
+                # The query the paginator runs for the first page
+                plan = view.get_queryset()[:KeysetPagination.page_size + 1].explain()
+                self.assertIn(self.index_name, plan)
+
+
+class TextSearchTests(CacheClearingTestCase):
+
+    def test_relevance_beats_recency(self):
+        category = bench_category()
+        user = bench_user(categories=[category])
+        # Many newer posts that only mention the term in their description
+        seed_posts(user, category, 1500)
+        Post.objects.update(description='Notes that mention django once')
+        best = Post.objects.create(author=user, category=category, title='Django django django', resources=[],
+                                   description='All about django')
+        Post.objects.filter(id=best.id).update(created=Post.objects.order_by('created')[0].created - timedelta(days=1))
+        response = PostListView.as_view()(api_request(user, q='django', page_size=5))
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['results'][0]['id'], best.id)
+
+
+class KeysetPaginationTests(CacheClearingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.category = bench_category()
+        self.user = bench_user(categories=[self.category])
+        seed_posts(self.user, self.category, 25)
+        # Ties on every ordering's leading field, only the id tells these apart
+        tied = Post.objects.order_by('id')[:10].values_list('id', flat=True)
+        Post.objects.filter(id__in=list(tied)).update(score=5, created=Post.objects.get(id=tied[0]).created)
+
+    def get_page(self, **params):
+        response = PostListView.as_view()(api_request(self.user, **params))
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def walk(self, **params):
+        ids, cursor = [], None
+        while True:
+            data = self.get_page(page_size=4, **params, **({'cursor': cursor} if cursor else {}))
+            ids += [post['id'] for post in data['results']]
+            if data['next'] is None:
+                return ids
+            cursor = parse_qs(urlparse(data['next']).query)['cursor'][0]
+
+    def test_pages_cover_every_row_once_in_order(self):
+        orderings = {'newest': ('-created', '-id'), 'rating': ('-score', '-id'), 'hot': ('-hot', '-id')}
+        for query, ordering in orderings.items():
+            with self.subTest(query=query):
+                expected = list(Post.objects.order_by(*ordering).values_list('id', flat=True))
+                self.assertEqual(self.walk(query=query), expected)
+
+    def test_rows_inserted_before_the_cursor_dont_shift_pages(self):
+        first = self.get_page(query='newest', page_size=4)
+        cursor = parse_qs(urlparse(first['next']).query)['cursor'][0]
+        expected = self.get_page(query='newest', page_size=4, cursor=cursor)['results']
+        seed_posts(self.user, self.category, 3)
+        caches['default'].clear()
+        self.assertEqual(self.get_page(query='newest', page_size=4, cursor=cursor)['results'], expected)
+
+    def test_invalid_cursors_are_rejected(self):
+        first = self.get_page(query='newest', page_size=4)
+        cursor = parse_qs(urlparse(first['next']).query)['cursor'][0]
+        for params in ({'cursor': 'not base64!'}, {'cursor': 'e30='}, {'query': 'rating', 'cursor': cursor}):
+            with self.subTest(**params):
+                response = PostListView.as_view()(api_request(self.user, **params))
+                self.assertEqual(response.status_code, 404)
+
+
+class FeedCacheTests(CacheClearingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.category, self.other_category = bench_category('Feed'), bench_category('Other')
+        self.user = bench_user('reader', [self.category])
+        self.other_user = bench_user('other reader', [self.other_category])
+        seed_posts(self.user, self.category, 3)
+        seed_posts(self.user, self.other_category, 1)
+        self.post = Post.objects.filter(category=self.category).first()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_feed(self, user=None):
+        self.client.force_authenticate(user or self.user)
+        response = self.client.get('/api/learnapp/post/list/', {'query': 'rating'})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertFeedRebuilt(self, user=None):
+        self.assertEqual(self.get_feed(user)['X-Feed-Cache'], 'MISS')
+
+    def assertFeedCached(self, user=None):
+        self.assertEqual(self.get_feed(user)['X-Feed-Cache'], 'HIT')
+
+    def test_repeated_reads_hit(self):
+        self.assertFeedRebuilt()
+        self.assertFeedCached()
+
+    def test_vote_invalidates(self):
+        for vote in (1, -1, 0):
+            with self.subTest(vote=vote):
+                self.get_feed()
+                self.client.put(f'/api/learnapp/vote/{self.post.id}/put/', {'vote': vote}, format='json')
+                response = self.get_feed()
+                self.assertEqual(response['X-Feed-Cache'], 'MISS')
+                scores = {post['id']: post['score'] for post in response.data['results']}
+                self.assertEqual(scores[self.post.id], Post.objects.get(id=self.post.id).score)
+
+    def test_vote_views_invalidate(self):
+        self.get_feed()
+        self.client.post('/api/learnapp/vote/create/', {'post': self.post.id, 'vote': 1}, format='json')
+        self.assertFeedRebuilt()
+        self.client.patch(f'/api/learnapp/vote/{self.post.id}/detail/', {'post': self.post.id, 'vote': -1},
+                          format='json')
+        self.assertFeedRebuilt()
+        self.client.delete(f'/api/learnapp/vote/{self.post.id}/detail/')
+        self.assertFeedRebuilt()
+
+    def test_post_edit_invalidates(self):
+        self.get_feed()
+        self.client.patch(f'/api/learnapp/post/{self.post.id}/update/', {'title': 'Edited'}, format='json')
+        response = self.get_feed()
+        self.assertEqual(response['X-Feed-Cache'], 'MISS')
+        self.assertIn('Edited', [post['title'] for post in response.data['results']])
+
+    def test_post_moved_to_another_category_invalidates_both(self):
+        self.get_feed()
+        self.get_feed(self.other_user)
+        post = Post.objects.get(id=self.post.id)
+        post.category = self.other_category
+        post.save()
+        self.assertFeedRebuilt()
+        self.assertFeedRebuilt(self.other_user)
+
+    def test_other_categories_stay_cached(self):
+        self.get_feed(self.other_user)
+        self.client.put(f'/api/learnapp/vote/{self.post.id}/put/', {'vote': 1}, format='json')
+        self.assertFeedCached(self.other_user)
+
+
+class ConditionalGetTests(TransactionTestCase):
+    """Versions come from updated = now(), which is the same for every write in one transaction, so every request
+    here commits on its own like in production."""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        category = bench_category()
+        self.user = bench_user('reader', [category])
+        seed_posts(self.user, category, 3)
+        self.post, self.other_post = Post.objects.all()[:2]
+        self.collection = Collection.objects.create(author=self.user, title='Reading')
+        self.collection.posts.add(self.post)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def revalidate(self, path, response):
+        return self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def assertNotModified(self, path, response):
+        # Answered from the version stamp alone
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate(path, response).status_code, 304)
+
+    def test_post_detail(self):
+        path = f'/api/learnapp/post/{self.post.id}/detail/'
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotModified(path, response)
+        modified_since = self.client.get(path, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(modified_since.status_code, 304)
+        self.client.put(f'/api/learnapp/vote/{self.post.id}/put/', {'vote': 1}, format='json')
+        changed = self.revalidate(path, response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['score'], Post.objects.get(id=self.post.id).score)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_collection_detail(self):
+        path = f'/api/learnapp/collection/{self.collection.id}/detail/'
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotModified(path, response)
+        changes = [
+            lambda: self.collection.posts.add(self.other_post),
+            lambda: self.client.put(f'/api/learnapp/vote/{self.post.id}/put/', {'vote': 1}, format='json'),
+            lambda: Post.objects.filter(id=self.other_post.id).delete(),
+        ]
+        for change in changes:
+            change()
+            changed = self.revalidate(path, response)
+            self.assertEqual(changed.status_code, 200)
+            self.assertNotEqual(changed['ETag'], response['ETag'])
+            response = changed
+
+    def test_missing_objects(self):
+        self.assertEqual(self.client.get('/api/learnapp/post/0/detail/', HTTP_IF_NONE_MATCH='"x"').status_code, 404)
+
+
+class CategoryCacheTests(CacheClearingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # The in-process table outlives the rolled back categories of earlier tests
+        category_cache.invalidate()
+        self.category = bench_category('Python')
+
+    def test_edits_through_the_orm_show_at_once(self):
+        self.assertEqual(category_cache.name(self.category.id), 'Python')
+        self.category.name = 'Python 3'
+        self.category.save()
+        self.assertEqual(category_cache.name(self.category.id), 'Python 3')
+        added = bench_category('Rust')
+        self.assertIn({'id': added.id, 'name': 'Rust'}, category_cache.categories())
+        added.delete()
+        self.assertNotIn(added.id, [category['id'] for category in category_cache.categories()])
+
+    def test_unknown_id_is_read_from_the_database(self):
+        category_cache.categories()
+        # Written without the signals, like a worker whose stamp never moves would see it
+        added = Category.objects.bulk_create([Category(name='Go')])[0]
+        self.assertEqual(category_cache.name(added.id), 'Go')
+        # The next call reloads the table once, then it's served from memory
+        with self.assertNumQueries(1):
+            self.assertIn({'id': added.id, 'name': 'Go'}, category_cache.categories())
+        with self.assertNumQueries(0):
+            self.assertEqual(category_cache.name(added.id), 'Go')
+
+    def test_local_table_expires(self):
+        self.assertEqual(category_cache.name(self.category.id), 'Python')
+        Category.objects.filter(id=self.category.id).update(name='Python 3')
+        self.assertEqual(category_cache.name(self.category.id), 'Python')
+        with override_settings(CATEGORY_CACHE_LOCAL_TTL=0):
+            self.assertEqual(category_cache.name(self.category.id), 'Python 3')
+
+
+class BulkTallyCommandTests(CacheClearingTestCase):
+    """Commands that rewrite tallies with UPDATEs skip the Post signals, they invalidate the feeds themselves."""
+
+    def setUp(self):
+        super().setUp()
+        self.category = bench_category()
+        self.user = bench_user(categories=[self.category])
+        seed_posts(self.user, self.category, 3)
+
+    def assertInvalidates(self, command):
+        before = feed_cache.category_versions([self.category.id])
+        call_command(command, stdout=StringIO())
+        self.assertNotEqual(feed_cache.category_versions([self.category.id]), before)
+
+    def test_reconcile_votes(self):
+        Post.objects.update(score=F('score') + 1)
+        self.assertInvalidates('reconcile_votes')
+        self.assertFalse(Post.objects.exclude(score=0).exists())
+
+    def test_refresh_hot_ranks(self):
+        Post.objects.update(hot=0)
+        self.assertInvalidates('refresh_hot_ranks')
+        self.assertFalse(Post.objects.filter(hot=0).exists())
+
+
+class PutVoteTests(CacheClearingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        category = bench_category()
+        self.author = bench_user('author', [category])
+        self.voter = bench_user('voter')
+        seed_posts(self.author, category, 1)
+        self.post = Post.objects.get()
+        Post.objects.filter(id=self.post.id).update(score=0, upvotes=0, downvotes=0)
+        self.comment = Comment.objects.create(author=self.author, post=self.post, body='Comment')
+
+    def assertTallies(self, score, upvotes, downvotes):
+        self.assertEqual(Post.objects.values_list('score', 'upvotes', 'downvotes').get(id=self.post.id),
+                         (score, upvotes, downvotes))
+
+    def test_set_change_and_clear(self):
+        self.assertEqual(put_post_vote(self.voter.id, self.post.id, 1), (1, self.post.category_id))
+        self.assertTallies(1, 1, 0)
+        # Repeating a vote changes nothing
+        self.assertEqual(put_post_vote(self.voter.id, self.post.id, 1), (1, self.post.category_id))
+        self.assertTallies(1, 1, 0)
+        self.assertEqual(put_post_vote(self.voter.id, self.post.id, -1), (-1, self.post.category_id))
+        self.assertTallies(-1, 0, 1)
+        self.assertEqual(Vote.objects.get(voter=self.voter, post=self.post).vote, -1)
+        self.assertEqual(put_post_vote(self.voter.id, self.post.id, 0), (0, self.post.category_id))
+        self.assertTallies(0, 0, 0)
+        self.assertFalse(Vote.objects.filter(voter=self.voter, post=self.post).exists())
+        # Clearing a missing vote
+        self.assertEqual(put_post_vote(self.voter.id, self.post.id, 0), (0, self.post.category_id))
+        self.assertTallies(0, 0, 0)
+
+    def test_missing_post(self):
+        self.assertIsNone(put_post_vote(self.voter.id, self.post.id + 1, 1))
+        self.assertFalse(Vote.objects.exists())
+
+    def test_comment_votes(self):
+        self.assertEqual(put_comment_vote(self.voter.id, self.comment.id, -1), (-1,))
+        self.assertEqual(put_comment_vote(self.voter.id, self.comment.id, 1), (1,))
+        self.assertEqual(VoteComment.objects.get().vote, 1)
+        self.assertEqual(put_comment_vote(self.voter.id, self.comment.id, 0), (0,))
+        self.assertEqual(Comment.objects.get().score, 0)
+        self.assertIsNone(put_comment_vote(self.voter.id, self.comment.id + 1, 1))
+
+
+@override_settings(VOTE_BUFFER_ENABLED=True)
+class VoteBufferTests(PutVoteTests):
+
+    def test_set_change_and_clear(self):
+        # The Vote rows change right away, the tallies wait for a flush
+        self.assertEqual(put_post_vote(self.voter.id, self.post.id, 1), (1, self.post.category_id))
+        self.assertTallies(0, 0, 0)
+        self.assertEqual(vote_buffer.pending('post', [self.post.id]), {self.post.id: {'score': 1, 'upvotes': 1}})
+        flushed = vote_buffer.flush()
+        self.assertEqual(flushed['post'], {self.post.id: {'score': 1, 'upvotes': 1}})
+        self.assertTallies(1, 1, 0)
+        self.assertEqual(vote_buffer.pending('post', [self.post.id]), {})
+
+        self.assertEqual(put_post_vote(self.voter.id, self.post.id, -1), (-1, self.post.category_id))
+        self.assertEqual(put_post_vote(self.voter.id, self.post.id, 0), (0, self.post.category_id))
+        vote_buffer.flush()
+        self.assertTallies(0, 0, 0)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_comment_votes(self):
+        self.assertEqual(put_comment_vote(self.voter.id, self.comment.id, -1), (-1,))
+        self.assertEqual(Comment.objects.get().score, 0)
+        vote_buffer.flush()
+        self.assertEqual(Comment.objects.get().score, -1)
+
+    def test_flush_is_exclusive(self):
+        put_post_vote(self.voter.id, self.post.id, 1)
+        with vote_buffer.flush_lock() as locked:
+            self.assertTrue(locked)
+            self.assertIsNone(vote_buffer.flush())
+        self.assertTallies(0, 0, 0)
+        vote_buffer.flush()
+        self.assertTallies(1, 1, 0)
+
+    def test_flush_with_nothing_pending(self):
+        self.assertEqual(vote_buffer.flush(), {'post': {}, 'comment': {}})
+
+
+class ClampingLocMemCache(LocMemCache):
+    """LocMemCache whose counters stop at 0 like memcached's decr."""
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta, version)
+        if value < 0:
+            self.set(key, 0, None, version)
+            return 0
+        return value
+
+
+@override_settings(
+    VOTE_BUFFER_CACHE='votes',
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+        'votes': {'BACKEND': 'learnapp.tests.ClampingLocMemCache', 'LOCATION': 'tests-votes'},
+    },
+)
+class ClampingVoteBufferTests(VoteBufferTests):
+    """The buffer on a cache that can't go below 0, downvotes and flushes must not be lost."""
+
+    def test_downvotes_before_any_upvote(self):
+        voters = [bench_user(f'downvoter{i}') for i in range(3)]
+        for voter in voters:
+            put_post_vote(voter.id, self.post.id, -1)
+        self.assertEqual(vote_buffer.pending('post', [self.post.id]), {self.post.id: {'score': -3, 'downvotes': 3}})
+        vote_buffer.flush()
+        self.assertTallies(-3, 0, 3)
+        self.assertEqual(vote_buffer.pending('post', [self.post.id]), {})
+
+
+class LocalStorageTestCase(TestCase):
+    """Uploads go to a LocalBackend in a temporary directory."""
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        with override_settings(STORAGE_LOCAL_ROOT=self.root, STORAGE_LOCAL_URL='http://storage.test/'):
+            backend = storage_backends.LocalBackend()
+        context = storage_backend(backend)
+        context.__enter__()
+        self.addCleanup(context.__exit__, None, None, None)
+        self.user = bench_user('uploader')
+
+    def upload(self, content, user=None, content_type='image/png'):
+        client = APIClient()
+        client.force_authenticate(user or self.user)
+        file = SimpleUploadedFile('image.png', content, content_type=content_type)
+        return client.post('/api/learnapp/file/', {'file': file}, format='multipart')
+
+    def stored_files(self):
+        return sorted(os.path.relpath(os.path.join(path, name), self.root)
+                      for path, _, names in os.walk(self.root) for name in names)
+
+
+class StreamingUploadTests(LocalStorageTestCase):
+
+    def test_image_is_streamed_to_storage(self):
+        content = os.urandom(200000)
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 201, response.data)
+        file_ref = FileRef.objects.get()
+        self.assertEqual(response.data['url'], file_ref.url)
+        self.assertEqual(file_ref.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(self.stored_files(), [file_ref.name])
+        with open(os.path.join(self.root, file_ref.name), 'rb') as file:
+            self.assertEqual(file.read(), content)
+
+    def test_handler_is_used(self):
+        handlers = []
+        original = StreamingImageUploadHandler.file_complete
+
+        def file_complete(handler, file_size):
+            handlers.append(handler)
+            return original(handler, file_size)
+
+        with mock.patch.object(StreamingImageUploadHandler, 'file_complete', file_complete):
+            self.assertEqual(self.upload(b'image bytes').status_code, 201)
+        self.assertEqual(len(handlers), 1)
+
+    def test_rejected_uploads_leave_nothing_behind(self):
+        for content, content_type in ((b'not an image', 'text/plain'), (os.urandom(IMAGE_MAX_SIZE), 'image/png')):
+            with self.subTest(content_type=content_type, size=len(content)):
+                self.assertEqual(self.upload(content, content_type=content_type).status_code, 400)
+                self.assertEqual(self.stored_files(), [])
+                self.assertFalse(FileRef.objects.exists())
+
+
+class DeduplicationTests(LocalStorageTestCase):
+
+    def delete_upload(self, url, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.user)
+        # The view only parses multipart bodies
+        return client.delete('/api/learnapp/file/', {'url': url}, format='multipart')
+
+    def test_same_bytes_twice_count_two_references(self):
+        content = os.urandom(50000)
+        first, second = self.upload(content), self.upload(content)
+        self.assertEqual(first.data['url'], second.data['url'])
+        self.assertEqual(FileRef.objects.get().references, 2)
+        self.assertEqual(len(self.stored_files()), 1)
+        self.assertEqual(self.delete_upload(first.data['url']).status_code, 204)
+        self.assertEqual(FileRef.objects.get().references, 1)
+        self.assertFalse(BlobDeletion.objects.exists())
+        self.assertEqual(self.delete_upload(first.data['url']).status_code, 204)
+        self.assertFalse(FileRef.objects.exists())
+        self.assertEqual(list(BlobDeletion.objects.values_list('name', flat=True)), self.stored_files())
+
+    def test_same_bytes_from_another_user_share_the_object(self):
+        content = os.urandom(50000)
+        other = bench_user('other uploader')
+        url = self.upload(content).data['url']
+        self.assertEqual(self.upload(content, other).data['url'], url)
+        self.assertEqual(sorted(FileRef.objects.values_list('author', 'references')),
+                         [(self.user.id, 1), (other.id, 1)])
+        self.assertEqual(len(self.stored_files()), 1)
+        self.delete_upload(url)
+        self.assertFalse(BlobDeletion.objects.exists())
+        self.delete_upload(url, other)
+        self.assertEqual(BlobDeletion.objects.count(), 1)
+
+    def test_different_bytes_are_stored_apart(self):
+        self.upload(os.urandom(50000))
+        self.upload(os.urandom(50000))
+        self.assertEqual(FileRef.objects.count(), 2)
+        self.assertEqual(len(self.stored_files()), 2)
+
+
+class RecordingBackend(FakeStorageBackend):
+    """Remembers what was deleted, deleting a name in fail raises."""
+
+    def __init__(self, fail=()):
+        super().__init__()
+        self.deleted = []
+        self.fail = set(fail)
+
+    def delete(self, name):
+        if name in self.fail:
+            raise OSError(f'{name} is unavailable')
+        self.deleted.append(name)
+
+
+class BlobDeletionTests(TransactionTestCase):
+    """Another drainer holds its claimed rows in an open transaction, which needs a second, committed connection."""
+
+    def setUp(self):
+        blob_deletions.enqueue([f'images/{index}' for index in range(6)])
+
+    def drain(self, backend):
+        with storage_backend(backend):
+            call_command('delete_blobs', batch_size=2, stdout=StringIO())
+
+    def test_rows_claimed_by_another_drainer_are_skipped(self):
+        claimed, release = threading.Event(), threading.Event()
+
+        def other_drainer():
+            try:
+                with transaction.atomic():
+                    list(BlobDeletion.objects.select_for_update().filter(name__in=['images/0', 'images/3']))
+                    claimed.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_drainer)
+        thread.start()
+        self.assertTrue(claimed.wait(10))
+        try:
+            backend = RecordingBackend()
+            self.drain(backend)
+            self.assertEqual(sorted(backend.deleted), ['images/1', 'images/2', 'images/4', 'images/5'])
+            self.assertEqual(sorted(BlobDeletion.objects.values_list('name', flat=True)), ['images/0', 'images/3'])
+        finally:
+            release.set()
+            thread.join()
+        self.drain(backend)
+        self.assertFalse(BlobDeletion.objects.exists())
+
+    def test_failed_deletions_back_off(self):
+        backend = RecordingBackend(fail=['images/2'])
+        with self.assertLogs('learnapp.blob_deletions', 'ERROR'):
+            self.drain(backend)
+        failed = BlobDeletion.objects.get()
+        self.assertEqual((failed.name, failed.attempts), ('images/2', 1))
+        self.assertGreater(failed.next_attempt, timezone.now())
+        # Not due yet
+        backend.fail.clear()
+        self.drain(backend)
+        self.assertTrue(BlobDeletion.objects.exists())
+        BlobDeletion.objects.update(next_attempt=timezone.now())
+        self.drain(backend)
+        self.assertFalse(BlobDeletion.objects.exists())
+        self.assertEqual(backend.deleted.count('images/2'), 1)
+
+
+class ReleaseFileTests(TestCase):
+
+    def setUp(self):
+        self.user = bench_user('uploader')
+        self.other = bench_user('other')
+        self.file_ref = FileRef.objects.create(
+            author=self.user, name='images/key', url='https://storage.local/images/key', sha256='a' * 64,
+            variants={'thumb': {'name': 'images/key.thumb.webp'}}, references=2,
+        )
+
+    def test_last_reference_queues_the_object_and_variants(self):
+        release_file(self.user, self.file_ref.url)
+        self.assertEqual(FileRef.objects.get().references, 1)
+        self.assertFalse(BlobDeletion.objects.exists())
+        release_file(self.user, self.file_ref.url)
+        self.assertFalse(FileRef.objects.exists())
+        self.assertEqual(sorted(BlobDeletion.objects.values_list('name', flat=True)),
+                         ['images/key', 'images/key.thumb.webp'])
+
+    def test_object_shared_with_another_user_is_kept(self):
+        FileRef.objects.create(author=self.other, name='images/key', url=self.file_ref.url, sha256='a' * 64)
+        FileRef.objects.filter(id=self.file_ref.id).update(references=1)
+        release_file(self.user, self.file_ref.url)
+        self.assertEqual(list(FileRef.objects.values_list('author', flat=True)), [self.other.id])
+        self.assertFalse(BlobDeletion.objects.exists())
+
+    def test_foreign_and_unknown_urls(self):
+        with self.assertRaises(PermissionError):
+            release_file(self.other, self.file_ref.url)
+        with self.assertRaises(FileRef.DoesNotExist):
+            release_file(self.user, 'https://storage.local/images/unknown')
+        self.assertEqual(FileRef.objects.get().references, 2)
+
+    def delete_post(self, post):
+        request = APIRequestFactory().delete('/')
+        force_authenticate(request, user=self.user)
+        response = PostDeleteView.as_view()(request, pk=post.pk)
+        self.assertEqual(response.status_code, 204)
+
+    def posts_showing_the_upload(self, count):
+        category = bench_category()
+        return [Post.objects.create(author=self.user, category=category, title=f'Post {index}', resources=[],
+                                    image=self.file_ref.url) for index in range(count)]
+
+    def test_upload_shown_by_two_posts_outlives_the_first(self):
+        FileRef.objects.filter(id=self.file_ref.id).update(references=1)
+        first, second = self.posts_showing_the_upload(2)
+        self.delete_post(first)
+        self.assertEqual(FileRef.objects.get().references, 0)
+        self.assertFalse(BlobDeletion.objects.exists())
+        self.delete_post(second)
+        self.assertFalse(FileRef.objects.exists())
+        self.assertTrue(BlobDeletion.objects.filter(name='images/key').exists())
+
+    def test_two_uploads_in_two_posts_are_freed_with_both(self):
+        first, second = self.posts_showing_the_upload(2)
+        self.delete_post(first)
+        self.assertEqual(FileRef.objects.get().references, 1)
+        self.delete_post(second)
+        self.assertFalse(FileRef.objects.exists())
+        self.assertTrue(BlobDeletion.objects.filter(name='images/key').exists())
+
+    def test_releasing_an_upload_a_post_shows_keeps_it(self):
+        self.posts_showing_the_upload(1)
+        release_file(self.user, self.file_ref.url)
+        release_file(self.user, self.file_ref.url)
+        self.assertEqual(FileRef.objects.get().references, 0)
+        self.assertFalse(BlobDeletion.objects.exists())
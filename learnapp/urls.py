@@ -2,11 +2,13 @@ from django.contrib import admin
 from django.conf import settings
 from django.urls import path
 from .views import *
+from .storage import FileStorageView
 from django.conf.urls.static import static
 
 urlpatterns = [
     # Posts
     path('post/list/', PostListView.as_view(), name='post_list'),
+    path('post/list/cache/', PostListCacheStatsView.as_view(), name='post_list_cache_stats'),
     path('post/create/', PostCreateView.as_view(), name='post_create'),
     path('post/<int:pk>/detail/', PostDetailView.as_view(), name='post_detail'),
     path('post/<int:pk>/update/', PostUpdateView.as_view(), name='post_update'),
@@ -15,11 +17,14 @@ urlpatterns = [
     # Vote Post
     path('vote/create/', VoteCreateView.as_view(), name='vote_create'),
     path('vote/<int:pk>/detail/', VoteRetrieveUpdateDestroyView.as_view(), name='vote_detail'),  # pk = Post.id
+    path('vote/<int:pk>/put/', VotePutView.as_view(), name='vote_put'),  # pk = Post.id
 
     # Collections
     path('collection/list/', CollectionListView.as_view(), name='collection_list'),
     path('collection/create/', CollectionCreateView.as_view(), name='collection_create'),
+    path('collection/batch/', CollectionBatchView.as_view(), name='collection_batch'),
     path('collection/<int:pk>/detail/', CollectionDetailView.as_view(), name='collection_detail'),
+    path('collection/<int:pk>/posts/', CollectionPostListView.as_view(), name='collection_posts'),
     path('collection/<int:pk>/update/', CollectionUpdateView.as_view(), name='collection_update'),
     path('collection/<int:pk>/delete/', CollectionDeleteView.as_view(), name='collection_delete'),
 
@@ -32,6 +37,7 @@ urlpatterns = [
     # Vote Comment
     path('vote_comment/create/', VoteCommentCreateView.as_view(), name='vote_create'),
     path('vote_comment/<int:pk>/detail/', VoteCommentRetrieveUpdateDestroyView.as_view(), name='vote_comment_rud'),  # pk = Comment.id
+    path('vote_comment/<int:pk>/put/', VoteCommentPutView.as_view(), name='vote_comment_put'),  # pk = Comment.id
 
     # Category
     path('category/list', CategoryListView.as_view(), name='category_list'),
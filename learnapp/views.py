@@ -1,12 +1,47 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Max
+from django.db.models.functions import Cast
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
 from rest_framework import permissions
 from rest_framework.exceptions import PermissionDenied, NotFound
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.generics import CreateAPIView, ListAPIView, DestroyAPIView, UpdateAPIView, RetrieveAPIView, \
     RetrieveUpdateDestroyAPIView
 from .serializers import PostSerializer, CollectionSerializer, VoteSerializer, CategorySerializer, CommentSerializer, \
-    VoteCommentSerializer
-from .models import Post, Collection, Vote, Category, Comment, VoteComment
-from .storage import FileStorageView
+    VoteCommentSerializer, VotePutSerializer, CollectionSummarySerializer, CollectionBatchSerializer
+from .models import Post, Collection, Vote, Category, Comment, VoteComment, FileRef
+from .storage import release_file
+from . import category_cache, feed_cache
+from .counters import apply_comment_vote, apply_post_vote, put_comment_vote, put_post_vote
+from .pagination import KeysetPagination
+from accounts import user_cache
+
+
+class ConditionalRetrieveMixin:
+    """Answer If-None-Match / If-Modified-Since with a 304 from a version stamp, without loading the object.
+
+    get_version() returns (last_modified, etag) for the requested object, or None to fall through to the view.
+    """
+
+    def get(self, request, *args, **kwargs):
+        version = self.get_version()
+        if version is None:
+            return super().get(request, *args, **kwargs)
+        last_modified, etag = version
+        return condition(
+            etag_func=lambda *args, **kwargs: etag,
+            last_modified_func=lambda *args, **kwargs: last_modified,
+        )(super().get)(request, *args, **kwargs)
+
+    def get_version(self):
+        raise NotImplementedError
+
+
+def version_tag(*parts):
+    return '-'.join(str(int(part.timestamp() * 1000000)) if hasattr(part, 'timestamp') else str(part) for part in parts)
 
 
 # POSTS
@@ -21,11 +56,17 @@ class PostCreateView(CreateAPIView):
         return serializer.save(author=self.request.user)
 
 
-class PostDetailView(RetrieveAPIView):
+class PostDetailView(ConditionalRetrieveMixin, RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     model = Post
     serializer_class = PostSerializer
-    queryset = Post.objects.all()
+    queryset = Post.objects.with_related()
+
+    def get_version(self):
+        updated = Post.objects.filter(pk=self.kwargs['pk']).values_list('updated', flat=True).first()
+        if updated is None:
+            return None
+        return updated, version_tag('post', self.kwargs['pk'], updated)
 
 
 class PostUpdateView(UpdateAPIView):
@@ -66,54 +107,111 @@ class PostDeleteView(DestroyAPIView):
     def perform_destroy(self, instance):
         if instance.author == self.request.user:
             print("+++++++++++++++++++GROSSS++++++++++++++++++")
-            if bool(instance.image):
-                FileStorageView.file_delete_helper(self.request, instance.image)
-            super(PostDeleteView, self).perform_destroy(instance)
+            with transaction.atomic():
+                super(PostDeleteView, self).perform_destroy(instance)
+                # Deleted first, so release_file only sees the author's other posts still showing the image
+                if bool(instance.image):
+                    try:
+                        release_file(self.request.user, instance.image)
+                    except (FileRef.DoesNotExist, PermissionError):
+                        # Not uploaded by the author
+                        pass
         else:
             raise PermissionDenied(detail='Permission denied.')
 
 
 class PostListView(ListAPIView):
+    """Posts in the followed categories, or by ?username=, a keyset page at a time.
+
+    ?query= newest (default), rating or hot picks the ordering. ?search=, ?search_any= and ?search_exclude= filter by
+    tags. ?q= is a full text search on title and description, ordered by relevance unless a ?query= is given.
+    """
     permission_classes = [permissions.IsAuthenticated]
     model = Post
     serializer_class = PostSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         queryset = self.filter_helper()
         return queryset
 
-    def filter_helper(self):
-        search = [x.lower() for x in self.request.query_params.getlist('search')]
-        username = self.request.query_params.get('username')
+    def list(self, request, *args, **kwargs):
+        # Category feeds are shared by everyone following the same categories, author feeds aren't cached
+        if request.query_params.get('username'):
+            return super(PostListView, self).list(request, *args, **kwargs)
+        key = feed_cache.page_key(self.get_categories(), request.query_params)
+        data = feed_cache.get_page(key)
+        if data is not None:
+            return Response(data, headers={'X-Feed-Cache': 'HIT'})
+        response = super(PostListView, self).list(request, *args, **kwargs)
+        feed_cache.set_page(key, response.data)
+        response['X-Feed-Cache'] = 'MISS'
+        return response
+
+    def get_categories(self):
+        if not hasattr(self, '_categories'):
+            # Materialized so the planner sees literal ids and can walk the per-category ordering indexes
+            self._categories = user_cache.category_ids(self.request.user)
+        return self._categories
+
+    def get_ordering(self):
+        # Every ordering ends with id so the keyset cursor is unique
         query = self.request.query_params.get("query")
-        category = self.request.user.userprofile.category.values_list('id', flat=True)
-        print("WHOA", search, type(username), type(category))
+        if query == "rating":
+            return '-score', '-id'
+        if query == "hot":
+            return '-hot', '-id'
+        if query != "newest" and self.request.query_params.get('q'):
+            return '-rank', '-id'
+        return '-created', '-id'
+
+    def filter_helper(self):
+        params = self.request.query_params
+        # Tag search, backed by the GIN index on tags:
+        # search = has all tags (@>), search_any = has any tag (&&), search_exclude = has none of the tags (NOT &&)
+        search = [x.lower() for x in params.getlist('search')]
+        search_any = [x.lower() for x in params.getlist('search_any')]
+        search_exclude = [x.lower() for x in params.getlist('search_exclude')]
+        # Full text search on title and description, ranked by relevance unless another ordering is asked for
+        text = params.get('q')
+        username = params.get('username')
         if username:
-            if search:
-                print('username search ran')
-                # Only shows posts that have all fields matching
-                queryset = Post.objects.filter(author__username=username, tags__contains=search)
-            else:
-                print('only username ran')
-                queryset = Post.objects.filter(author__username=username)
-        elif search:
-            print('only search ran')
-            queryset = Post.objects.filter(category__in=category, tags__contains=search)
-            print(queryset, category)
+            queryset = Post.objects.with_related().filter(author__username=username)
         else:
-            print('else ran')
-            queryset = Post.objects.filter(category__in=category)
+            queryset = Post.objects.with_related().filter(category__in=self.get_categories())
+
+        if search:
+            queryset = queryset.filter(tags__contains=search)
+        if search_any:
+            queryset = queryset.filter(tags__overlap=search_any)
+        if search_exclude:
+            # Untagged posts are kept, Django renders this as NOT (tags && ...) OR tags IS NULL
+            queryset = queryset.exclude(tags__overlap=search_exclude)
+        if text:
+            text_query = SearchQuery(text, config='english', search_type='websearch')
+            queryset = queryset.filter(search_vector=text_query)
+            if self.get_ordering()[0] == '-rank':
+                # Every match is ranked, the GIN index finds them and the paginator's LIMIT keeps only the top of the
+                # sort. Cast to double precision so the rank survives the round trip through a cursor exactly.
+                queryset = queryset.annotate(rank=Cast(SearchRank(F('search_vector'), text_query), FloatField()))
+        return queryset.order_by(*self.get_ordering())
 
-        if query == "newest":
-            queryset = queryset.order_by('-created')
-        elif query == "rating":
-            queryset = sorted(queryset, key=lambda a: a.score, reverse=True)
-        else:
-            queryset = queryset
-        return queryset
+
+class PostListCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(feed_cache.stats())
 
 
 # POST VOTES
+def invalidate_vote_feeds(post_id):
+    # Scores feed the rating and hot orderings
+    category_id = Post.objects.filter(id=post_id).values_list('category_id', flat=True).first()
+    if category_id is not None:
+        feed_cache.invalidate_on_commit(category_id)
+
+
 class VoteCreateView(CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     model = Vote
@@ -121,7 +219,11 @@ class VoteCreateView(CreateAPIView):
 
     def perform_create(self, serializer):
         serializer.is_valid(raise_exception=True)
-        return serializer.save(voter=self.request.user)
+        with transaction.atomic():
+            vote = serializer.save(voter=self.request.user)
+            apply_post_vote(vote.post_id, None, vote.vote)
+            invalidate_vote_feeds(vote.post_id)
+        return vote
 
 
 class VoteRetrieveUpdateDestroyView(RetrieveUpdateDestroyAPIView):
@@ -143,17 +245,42 @@ class VoteRetrieveUpdateDestroyView(RetrieveUpdateDestroyAPIView):
         obj = self.get_object()
         serializer.is_valid(raise_exception=True)
         if obj.voter == self.request.user:
-            serializer.save(voter=self.request.user)
+            with transaction.atomic():
+                # Lock the vote so concurrent updates can't both apply a delta from the same old value
+                old_vote = Vote.objects.select_for_update().values_list('vote', flat=True).get(pk=obj.pk)
+                vote = serializer.save(voter=self.request.user)
+                apply_post_vote(vote.post_id, old_vote, vote.vote)
+                invalidate_vote_feeds(vote.post_id)
         else:
             raise PermissionDenied(detail='Permission denied.')
 
     def perform_destroy(self, instance):
         if instance.voter == self.request.user:
-            super(VoteRetrieveUpdateDestroyView, self).perform_destroy(instance)
+            with transaction.atomic():
+                old_vote = Vote.objects.select_for_update().values_list('vote', flat=True).get(pk=instance.pk)
+                super(VoteRetrieveUpdateDestroyView, self).perform_destroy(instance)
+                apply_post_vote(instance.post_id, old_vote, None)
+                invalidate_vote_feeds(instance.post_id)
         else:
             raise PermissionDenied(detail='Permission denied.')
 
 
+class VotePutView(APIView):
+    """Set, change or (with 0) clear the user's vote on a post in one statement and answer with the new score."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def put(self, request, *args, **kwargs):
+        serializer = VotePutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        vote = serializer.validated_data['vote']
+        result = put_post_vote(request.user.id, self.kwargs['pk'], vote)
+        if result is None:
+            raise NotFound(detail='The post with given id doesn\'t exist')
+        score, category_id = result
+        feed_cache.invalidate_on_commit(category_id)
+        return Response({'post': self.kwargs['pk'], 'vote': vote, 'score': score})
+
+
 # COLLECTIONS
 class CollectionCreateView(CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -165,23 +292,34 @@ class CollectionCreateView(CreateAPIView):
         return serializer.save(author=self.request.user)
 
 
-class CollectionDetailView(RetrieveAPIView):
+class CollectionDetailView(ConditionalRetrieveMixin, RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     model = Collection
     serializer_class = CollectionSerializer
-    queryset = Collection.objects.all()
+    queryset = Collection.objects.with_posts()
 
     def get_object(self):
         queryset = self.get_queryset()
         obj = get_object_or_404(queryset, id=self.kwargs['pk'], author=self.request.user)
         return obj
 
+    def get_version(self):
+        # The embedded posts change with votes and edits too, the count catches posts deleted outright
+        version = Collection.objects.filter(id=self.kwargs['pk'], author=self.request.user).annotate(
+            posts_updated=Max('posts__updated'), post_count=Count('posts'),
+        ).values_list('updated', 'posts_updated', 'post_count').first()
+        if version is None:
+            return None
+        updated, posts_updated, post_count = version
+        last_modified = max(updated, posts_updated or updated)
+        return last_modified, version_tag('collection', self.kwargs['pk'], last_modified, post_count)
+
 
 class CollectionUpdateView(UpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     model = Collection
     serializer_class = CollectionSerializer
-    queryset = Collection.objects.all()
+    queryset = Collection.objects.with_posts()
 
     def get_object(self):
         queryset = self.get_queryset()
@@ -222,13 +360,45 @@ class CollectionDeleteView(DestroyAPIView):
 class CollectionListView(ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     model = Collection
-    serializer_class = CollectionSerializer
+    serializer_class = CollectionSummarySerializer
 
     def get_queryset(self):
-        queryset = Collection.objects.filter(author=self.request.user)
+        queryset = Collection.objects.with_summary().filter(author=self.request.user)
         return queryset
 
 
+class CollectionBatchView(APIView):
+    """Add or remove many posts across many collections, answering with the summaries of those collections."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = CollectionBatchSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        collections = Collection.objects.filter(author=request.user, id__in=data['collections'])
+        with transaction.atomic():
+            if data['type'] == 'post_add':
+                collections.add_posts(data['posts'])
+            else:
+                collections.remove_posts(data['posts'])
+        return Response(CollectionSummarySerializer(collections.with_summary(), many=True).data)
+
+
+class CollectionPostListView(ListAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    model = Post
+    serializer_class = PostSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-created', '-id')
+
+    def get_queryset(self):
+        if Collection.objects.filter(id=self.kwargs['pk'], author=self.request.user).exists():
+            queryset = Post.objects.with_related().filter(collection=self.kwargs['pk'])
+        else:
+            raise NotFound(detail='The collection with given id doesn\'t exist')
+        return queryset.order_by(*self.ordering)
+
+
 # COMMENTS
 class CommentCreateView(CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -269,14 +439,15 @@ class CommentListView(ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     model = Comment
     serializer_class = CommentSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-score', '-id')
 
     def get_queryset(self):
         if Post.objects.filter(id=self.kwargs['pk']).exists():
-            queryset = Comment.objects.filter(post__id=self.kwargs['pk'])
-            queryset = sorted(queryset, key=lambda a: a.score, reverse=True)
+            queryset = Comment.objects.select_related('author').filter(post__id=self.kwargs['pk'])
         else:
             raise NotFound(detail='The post with given id doesn\'t exist')
-        return queryset
+        return queryset.order_by(*self.ordering)
 
 
 # COMMENT VOTE
@@ -287,7 +458,10 @@ class VoteCommentCreateView(CreateAPIView):
 
     def perform_create(self, serializer):
         serializer.is_valid(raise_exception=True)
-        return serializer.save(voter=self.request.user)
+        with transaction.atomic():
+            vote = serializer.save(voter=self.request.user)
+            apply_comment_vote(vote.comment_id, None, vote.vote)
+        return vote
 
 
 class VoteCommentRetrieveUpdateDestroyView(RetrieveUpdateDestroyAPIView):
@@ -309,17 +483,38 @@ class VoteCommentRetrieveUpdateDestroyView(RetrieveUpdateDestroyAPIView):
         obj = self.get_object()
         serializer.is_valid(raise_exception=True)
         if obj.voter == self.request.user:
-            serializer.save(voter=self.request.user)
+            with transaction.atomic():
+                # Lock the vote so concurrent updates can't both apply a delta from the same old value
+                old_vote = VoteComment.objects.select_for_update().values_list('vote', flat=True).get(pk=obj.pk)
+                vote = serializer.save(voter=self.request.user)
+                apply_comment_vote(vote.comment_id, old_vote, vote.vote)
         else:
             raise PermissionDenied(detail='Permission denied.')
 
     def perform_destroy(self, instance):
         if instance.voter == self.request.user:
-            super(VoteCommentRetrieveUpdateDestroyView, self).perform_destroy(instance)
+            with transaction.atomic():
+                old_vote = VoteComment.objects.select_for_update().values_list('vote', flat=True).get(pk=instance.pk)
+                super(VoteCommentRetrieveUpdateDestroyView, self).perform_destroy(instance)
+                apply_comment_vote(instance.comment_id, old_vote, None)
         else:
             raise PermissionDenied(detail='Permission denied.')
 
 
+class VoteCommentPutView(APIView):
+    """Set, change or (with 0) clear the user's vote on a comment in one statement and answer with the new score."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def put(self, request, *args, **kwargs):
+        serializer = VotePutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        vote = serializer.validated_data['vote']
+        result = put_comment_vote(request.user.id, self.kwargs['pk'], vote)
+        if result is None:
+            raise NotFound(detail='The comment with given id doesn\'t exist')
+        return Response({'comment': self.kwargs['pk'], 'vote': vote, 'score': result[0]})
+
+
 # class VoteUpdateView(UpdateAPIView):
 #     permission_classes = [permissions.IsAuthenticated]
 #     model = Vote
@@ -368,3 +563,6 @@ class CategoryListView(ListAPIView):
     model = Category
     serializer_class = CategorySerializer
     queryset = Category.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        return Response(category_cache.categories())
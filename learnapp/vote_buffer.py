@@ -0,0 +1,173 @@
+"""Write-behind buffer for vote tallies.
+
+With VOTE_BUFFER_ENABLED, vote writes still insert, change or delete their Vote/VoteComment row right away, but the
+matching tally deltas are added to counters in the VOTE_BUFFER_CACHE cache instead of updating the Post/Comment row,
+which every voter of a viral post would otherwise queue on. The flush_votes command moves the pending deltas to the
+rows in batched UPDATEs, and serializers add the still pending deltas to what they read.
+
+Every target with pending deltas is listed once in an append-only journal: the first delta after a flush sets a dirty
+marker and appends the target, the flusher clears the marker before reading the counters, so a delta landing in
+between is either read now or journaled again. Counters are moved with decr by the value read, never reset, so deltas
+added meanwhile stay pending. They are stored offset by COUNTER_BASE, memcached clamps decr at 0 and would drop
+whatever takes a counter below it. Buffered workers and the flusher must share the cache, the default LocMemCache only
+works within one process (tests, or running flush() in-process). Deltas lost with the cache (a target whose stored
+tally drifted from its vote rows) are repaired by reconcile_votes, which counts the still pending deltas as applied.
+"""
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from .models import Comment, Post
+
+TALLIES = {
+    'post': (Post, ('score', 'upvotes', 'downvotes')),
+    'comment': (Comment, ('score',)),
+}
+COUNTER_KEY = 'votes:{}:{}:{}'
+DIRTY_KEY = 'votes:dirty:{}:{}'
+JOURNAL_KEY = 'votes:journal:{}'
+SEQUENCE_KEY = 'votes:journal:sequence'
+FLUSHED_KEY = 'votes:journal:flushed'
+LOCK_KEY = 'votes:flush:lock'
+# Stored value of a counter with nothing pending, far above any delta that can build up between flushes
+COUNTER_BASE = 2 ** 32
+
+
+def enabled():
+    return settings.VOTE_BUFFER_ENABLED
+
+
+def _cache():
+    return caches[settings.VOTE_BUFFER_CACHE]
+
+
+def _incr(cache, key, delta, base=0):
+    cache.add(key, base, None)
+    try:
+        return cache.incr(key, delta) - base
+    except ValueError:
+        # Evicted between add and incr
+        cache.add(key, base + delta, None)
+        return delta
+
+
+def add(kind, target_id, deltas):
+    """Buffer deltas, a {tally field: change} dict, for one target. Returns the pending deltas including these."""
+    cache = _cache()
+    pending = {field: _incr(cache, COUNTER_KEY.format(kind, target_id, field), delta, COUNTER_BASE)
+               for field, delta in deltas.items() if delta}
+    # Dirty markers expire, so a target whose journal entry got lost is journaled again by its next vote
+    if pending and cache.add(DIRTY_KEY.format(kind, target_id), 1, settings.VOTE_BUFFER_DIRTY_TIMEOUT):
+        sequence = _incr(cache, SEQUENCE_KEY, 1)
+        cache.set(JOURNAL_KEY.format(sequence), (kind, target_id), settings.VOTE_BUFFER_DIRTY_TIMEOUT)
+    return pending
+
+
+def add_on_commit(kind, target_id, deltas):
+    """Buffer deltas once the current transaction commits, so a rolled back vote leaves no delta behind."""
+    transaction.on_commit(lambda: add(kind, target_id, deltas))
+
+
+def pending(kind, target_ids):
+    """{target id: {tally field: pending delta}} for the given targets, in one cache round trip."""
+    fields = TALLIES[kind][1]
+    keys = {COUNTER_KEY.format(kind, target_id, field): (target_id, field)
+            for target_id in target_ids for field in fields}
+    result = {}
+    for key, value in _cache().get_many(list(keys)).items():
+        if value != COUNTER_BASE:
+            target_id, field = keys[key]
+            result.setdefault(target_id, {})[field] = value - COUNTER_BASE
+    return result
+
+
+def merge(kind, representations):
+    """Add the pending deltas to serialized targets (dicts with an 'id' and the tally fields), in place."""
+    if not enabled() or not representations:
+        return representations
+    deltas = pending(kind, [representation['id'] for representation in representations])
+    for representation in representations:
+        for field, delta in deltas.get(representation['id'], {}).items():
+            if field in representation:
+                representation[field] += delta
+    return representations
+
+
+@contextmanager
+def flush_lock():
+    """Hold off flushes within the block. Yields False, without waiting, if a flush already runs."""
+    cache = _cache()
+    if not cache.add(LOCK_KEY, 1, settings.VOTE_BUFFER_DIRTY_TIMEOUT):
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def flush(batch_size=500):
+    """Move every journaled target's pending deltas to its row. Returns {kind: {target id: deltas}} of what moved.
+
+    Only one flush runs at a time, a concurrent call returns None right away.
+    """
+    with flush_lock() as locked:
+        if not locked:
+            return None
+        return _flush(_cache(), batch_size)
+
+
+def _flush(cache, batch_size):
+    flushed = {kind: {} for kind in TALLIES}
+    last = cache.get(FLUSHED_KEY, 0)
+    sequence = cache.get(SEQUENCE_KEY, 0)
+    if sequence < last:
+        # The sequence was evicted and restarted
+        last = 0
+    for start in range(last + 1, sequence + 1, batch_size):
+        numbers = range(start, min(start + batch_size, sequence + 1))
+        entries = cache.get_many([JOURNAL_KEY.format(number) for number in numbers])
+        targets = {}
+        for kind, target_id in set(entries.values()):
+            targets.setdefault(kind, []).append(target_id)
+        for kind, target_ids in targets.items():
+            flushed[kind].update(_flush_targets(cache, kind, target_ids))
+        cache.set(FLUSHED_KEY, numbers[-1], None)
+        cache.delete_many(list(entries))
+    return flushed
+
+
+def _flush_targets(cache, kind, target_ids):
+    model, fields = TALLIES[kind]
+    cache.delete_many([DIRTY_KEY.format(kind, target_id) for target_id in target_ids])
+    moved = pending(kind, target_ids)
+    if not moved:
+        return moved
+    for target_id, deltas in moved.items():
+        for field, delta in deltas.items():
+            _incr(cache, COUNTER_KEY.format(kind, target_id, field), -delta, COUNTER_BASE)
+    try:
+        with transaction.atomic():
+            _apply(model, fields, moved)
+    except Exception:
+        # Put them back, the journal position doesn't move so the next flush retries them
+        for target_id, deltas in moved.items():
+            for field, delta in deltas.items():
+                _incr(cache, COUNTER_KEY.format(kind, target_id, field), delta, COUNTER_BASE)
+        raise
+    return moved
+
+
+def _apply(model, fields, moved):
+    table = connection.ops.quote_name(model._meta.db_table)
+    assignments = [f'{field} = {table}.{field} + delta.{field}' for field in fields]
+    if any(field.name == 'updated' for field in model._meta.fields):
+        assignments.append('updated = now()')
+    rows = [[target_id] + [deltas.get(field, 0) for field in fields] for target_id, deltas in moved.items()]
+    values = ', '.join(['(%s' + ', %s' * len(fields) + ')'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {', '.join(assignments)} "
+            f"FROM (VALUES {values}) AS delta (id, {', '.join(fields)}) WHERE {table}.id = delta.id",
+            [value for row in rows for value in row],
+        )